@@ -0,0 +1,33 @@
+"""Add catalog version
+
+Revision ID: 1caa9af7318a
+Revises: ecae82d18bd5
+Create Date: 2026-10-18 22:05:17.304518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1caa9af7318a'
+down_revision: Union[str, None] = 'ecae82d18bd5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Единственная строка счётчика; её обновление сериализует запись каталога между экземплярами бота
+    op.execute(catalog_version.insert().values(id=1, version=1, updated_at=sa.func.now()))
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_version')
@@ -0,0 +1,35 @@
+"""Add fsm_storage
+
+Revision ID: 4ea538617558
+Revises: ea829c7cddce
+Create Date: 2026-10-18 17:30:23.030486
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4ea538617558'
+down_revision: Union[str, None] = 'ea829c7cddce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('fsm_storage',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('destiny', sa.String(length=50), nullable=False),
+    sa.Column('state', sa.String(length=255), nullable=True),
+    sa.Column('data', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_fsm_storage_destiny'), 'fsm_storage', ['destiny'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_fsm_storage_destiny'), table_name='fsm_storage')
+    op.drop_table('fsm_storage')
@@ -0,0 +1,27 @@
+"""Add items.image_file_id
+
+Revision ID: 5d1f0c7be2a4
+Revises: 1caa9af7318a
+Create Date: 2026-10-18 23:41:08.512377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1f0c7be2a4'
+down_revision: Union[str, None] = '1caa9af7318a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('items', sa.Column('image_file_id', sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.drop_column('image_file_id')
@@ -0,0 +1,29 @@
+"""Add broadcasts.owner and broadcasts.lease_until
+
+Revision ID: 7c3e91d4a2b8
+Revises: 5d1f0c7be2a4
+Create Date: 2026-10-18 19:02:41.337105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e91d4a2b8'
+down_revision: Union[str, None] = '5d1f0c7be2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('broadcasts', sa.Column('owner', sa.String(length=32), nullable=True))
+    op.add_column('broadcasts', sa.Column('lease_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('broadcasts') as batch_op:
+        batch_op.drop_column('lease_until')
+        batch_op.drop_column('owner')
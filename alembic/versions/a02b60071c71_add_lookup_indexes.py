@@ -0,0 +1,49 @@
+"""Add lookup indexes
+
+Revision ID: a02b60071c71
+Revises: fd02f667fa02
+Create Date: 2026-10-18 20:15:37.204981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a02b60071c71'
+down_revision: Union[str, None] = 'fd02f667fa02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# basket(user_id, item_id) уже покрыт ограничением uq_basket_user_item
+INDEXES = [
+    ('ix_items_variant', 'items',
+     ['model_id', 'color_id', 'memory_id', 'ram_id', 'connectivity_id', 'screen_size_id']),
+    ('ix_colors_model_id', 'colors', ['model_id']),
+    ('ix_memory_model_id', 'memory', ['model_id']),
+    ('ix_RMA_model_id', 'RMA', ['model_id']),
+    ('ix_screen_sizes_model_id', 'screen_sizes', ['model_id']),
+    ('ix_models_category_id', 'models', ['category_id']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_broadcasts_status', 'broadcasts', ['status']),
+]
+
+
+def _existing(table: str) -> list:
+    return sa.inspect(op.get_bind()).get_indexes(table)
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        # MySQL сам создаёт индекс под внешний ключ — такой же второй индекс только замедлит запись
+        if any(index['column_names'] == columns for index in _existing(table)):
+            continue
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        if any(index['name'] == name for index in _existing(table)):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,57 @@
+"""Numeric prices
+
+Revision ID: ac14555de71b
+Revises: a02b60071c71
+Create Date: 2026-10-18 20:52:09.118406
+
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ac14555de71b'
+down_revision: Union[str, None] = 'a02b60071c71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _normalize(raw):
+    value = str(raw).replace('\xa0', '').replace(' ', '').replace('руб.', '').replace('руб', '').replace(',', '.')
+    try:
+        price = Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return None
+    return price if Decimal(0) <= price <= Decimal('9999999999.99') else None
+
+
+def _convert(table: str) -> None:
+    # Строковые цены приводим к виду 12345.00; если хоть одна не разбирается, миграция
+    # останавливается со списком строк, которые нужно исправить вручную
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(f'SELECT id, price FROM {table}')).all()
+    invalid = [(row_id, price) for row_id, price in rows if _normalize(price) is None]
+    if invalid:
+        raise ValueError(f'Некорректные цены в {table}: {invalid[:20]}')
+
+    updates = [{'id': row_id, 'price': str(_normalize(price))} for row_id, price in rows
+               if str(_normalize(price)) != price]
+    if updates:
+        connection.execute(sa.text(f'UPDATE {table} SET price = :price WHERE id = :id'), updates)
+
+    op.alter_column(table, 'price', existing_type=sa.String(length=10), type_=sa.Numeric(precision=12, scale=2),
+                    existing_nullable=False)
+
+
+def upgrade() -> None:
+    _convert('items')
+    _convert('order_items')
+
+
+def downgrade() -> None:
+    for table in ('order_items', 'items'):
+        op.alter_column(table, 'price', existing_type=sa.Numeric(precision=12, scale=2), type_=sa.String(length=10),
+                        existing_nullable=False)
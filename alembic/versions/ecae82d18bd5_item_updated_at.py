@@ -0,0 +1,48 @@
+"""Item updated_at and price export log
+
+Revision ID: ecae82d18bd5
+Revises: ac14555de71b
+Create Date: 2026-10-18 21:34:40.512907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecae82d18bd5'
+down_revision: Union[str, None] = 'ac14555de71b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # В MySQL время обновляет сама БД, поэтому учитываются и правки справочника вручную, мимо бота;
+    # существующие товары получают время миграции
+    if op.get_bind().dialect.name == 'mysql':
+        server_default = sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')
+    else:
+        server_default = sa.func.now()
+    # batch: SQLite не умеет ADD COLUMN с непостоянным значением по умолчанию и пересоздаёт таблицу
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=server_default, nullable=False))
+        batch_op.create_index(batch_op.f('ix_items_updated_at'), ['updated_at'], unique=False)
+
+    op.create_table('price_exports',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('since', sa.DateTime(), nullable=True),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_price_exports_started_at'), 'price_exports', ['started_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_price_exports_started_at'), table_name='price_exports')
+    op.drop_table('price_exports')
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_items_updated_at'))
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,38 @@
+"""Basket unique user_id, item_id
+
+Revision ID: fd02f667fa02
+Revises: 2b5d13db2f40
+Create Date: 2026-10-18 19:48:12.660315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fd02f667fa02'
+down_revision: Union[str, None] = '2b5d13db2f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Сначала схлопываем повторяющиеся строки: количество суммируется в строку с меньшим id
+    connection = op.get_bind()
+    duplicates = connection.execute(sa.text(
+        'SELECT user_id, item_id, MIN(id), SUM(quantity) FROM basket '
+        'GROUP BY user_id, item_id HAVING COUNT(*) > 1'
+    )).all()
+    for user_id, item_id, keep_id, quantity in duplicates:
+        connection.execute(sa.text('UPDATE basket SET quantity = :quantity WHERE id = :id'),
+                           {'quantity': quantity, 'id': keep_id})
+        connection.execute(sa.text('DELETE FROM basket WHERE user_id = :user_id AND item_id = :item_id AND id <> :id'),
+                           {'user_id': user_id, 'item_id': item_id, 'id': keep_id})
+
+    op.create_unique_constraint('uq_basket_user_item', 'basket', ['user_id', 'item_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_basket_user_item', 'basket', type_='unique')
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError,
+                                TelegramRetryAfter, TelegramServerError)
+from sqlalchemy import exists, func, insert, or_, select, update
+
+from database.models import Broadcast, BroadcastDelivery, Users, async_session
+from filters.config import broadcast_config
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Рассылку проводит экземпляр бота, взявший её в аренду; пока он жив, аренда продлевается,
+# а если процесс упал, рассылку можно продолжить (/broadcast_resume) после истечения аренды
+_LEASE = timedelta(minutes=2)
+
+
+class BroadcastReport(NamedTuple):
+    broadcast_id: int
+    sent: int
+    failed: int
+    blocked: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Сообщений в секунду за этот запуск."""
+        total = self.sent + self.failed + self.blocked
+        return total / self.elapsed if self.elapsed else 0.0
+
+
+async def create_broadcast(text: str) -> int:
+    async with async_session() as session:
+        broadcast = Broadcast(text=text)
+        session.add(broadcast)
+        await session.commit()
+        return broadcast.id
+
+
+async def _next_batch(broadcast_id: int, after_user_id: int, limit: int) -> List[Tuple[int, int]]:
+    # Keyset-пагинация по users.id; получатели, которым уже отправляли (в том числе в прерванной
+    # пачке), пропускаются
+    delivered = exists().where(BroadcastDelivery.broadcast_id == broadcast_id,
+                               BroadcastDelivery.user_id == Users.id)
+    async with async_session() as session:
+        result = await session.execute(
+            select(Users.id, Users.telegram_id)
+            .where(Users.id > after_user_id, Users.telegram_id.is_not(None), ~delivered)
+            .order_by(Users.id)
+            .limit(limit)
+        )
+        return list(result.all())
+
+
+async def _deliver(bot: Bot, bucket: TokenBucket, chat_id: int, text: str) -> Tuple[str, int, Optional[str]]:
+    """Отправляет одно сообщение с повторами; возвращает статус доставки, число попыток и ошибку."""
+    attempt = 0
+    while True:
+        attempt += 1
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return 'sent', attempt, None
+        except TelegramRetryAfter as e:
+            # Flood wait общий для бота — останавливаем все отправки, а не только эту
+            bucket.pause(e.retry_after)
+            error = e.message
+        except TelegramForbiddenError as e:
+            return 'blocked', attempt, e.message
+        except TelegramBadRequest as e:
+            return 'failed', attempt, e.message
+        except (TelegramNetworkError, TelegramServerError) as e:
+            error = str(e)
+            # Экспоненциальная задержка со случайной добавкой; между попытками в один чат
+            # всегда больше секунды, так что лимит Telegram на чат не превышается
+            await asyncio.sleep(min(2 ** attempt, 60) + random.random())
+        except TelegramAPIError as e:
+            return 'failed', attempt, e.message
+
+        if attempt >= broadcast_config.MAX_ATTEMPTS:
+            return 'failed', attempt, error
+
+
+async def _acquire(broadcast_id: int, owner: str) -> Optional[Broadcast]:
+    """Берёт незавершённую рассылку в аренду; None — её нет, она завершена или её проводит другой экземпляр."""
+    async with async_session() as session:
+        # Аренда считается по часам БД, как и в outbox
+        now = await session.scalar(select(func.now()))
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == 'running',
+                   or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now))
+            .values(owner=owner, lease_until=now + _LEASE)
+        )
+        if result.rowcount != 1:
+            return None
+        broadcast = await session.get(Broadcast, broadcast_id)
+        await session.commit()
+        return broadcast
+
+
+async def _renew(broadcast_id: int, owner: str) -> bool:
+    async with async_session() as session:
+        now = await session.scalar(select(func.now()))
+        result = await session.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.owner == owner)
+            .values(lease_until=now + _LEASE)
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+
+async def _release(broadcast_id: int, owner: str, **values) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.owner == owner)
+            .values(owner=None, lease_until=None, **values)
+        )
+        await session.commit()
+
+
+async def _save_progress(broadcast_id: int, owner: str, deliveries: List[Dict], last_user_id: Optional[int]) -> bool:
+    """Записывает доставки пачки и сдвигает курсор рассылки одной транзакцией.
+    False — аренду рассылки уже взял другой экземпляр, ничего не записано."""
+    counters = {status: sum(1 for delivery in deliveries if delivery['status'] == status)
+                for status in ('sent', 'failed', 'blocked')}
+    values = {status: getattr(Broadcast, status) + count for status, count in counters.items()}
+    if last_user_id is not None:
+        values['last_user_id'] = last_user_id
+
+    async with async_session() as session:
+        result = await session.execute(update(Broadcast)
+                                       .where(Broadcast.id == broadcast_id, Broadcast.owner == owner)
+                                       .values(**values))
+        if result.rowcount != 1:
+            await session.rollback()
+            return False
+        if deliveries:
+            await session.execute(insert(BroadcastDelivery), deliveries)
+        await session.commit()
+    return True
+
+
+async def run_broadcast(bot: Bot, broadcast_id: int) -> Optional[BroadcastReport]:
+    """Проводит рассылку (или продолжает прерванную) и возвращает отчёт об этом запуске.
+    None — рассылка завершена или её уже проводит этот или другой экземпляр бота."""
+    owner = uuid.uuid4().hex
+    broadcast = await _acquire(broadcast_id, owner)
+    if broadcast is None:
+        logger.info('Рассылка %s не запущена: завершена или уже идёт', broadcast_id)
+        return None
+
+    bucket = TokenBucket(broadcast_config.RATE)
+    semaphore = asyncio.Semaphore(broadcast_config.CONCURRENCY)
+    totals = {'sent': 0, 'failed': 0, 'blocked': 0}
+    started = time.monotonic()
+    last_user_id = broadcast.last_user_id
+
+    async def send(user_id: int, chat_id: int, results: List[Dict]) -> None:
+        async with semaphore:
+            status, attempts, error = await _deliver(bot, bucket, chat_id, broadcast.text)
+        results.append({'broadcast_id': broadcast_id, 'user_id': user_id, 'status': status,
+                        'attempts': attempts, 'error': error[:255] if error else None})
+
+    async def keep_lease() -> None:
+        # Пачка может идти дольше аренды (flood wait), поэтому аренда продлевается отдельно от пачек
+        while True:
+            await asyncio.sleep(_LEASE.total_seconds() / 4)
+            if not await _renew(broadcast_id, owner):
+                logger.warning('Рассылка %s: аренду взял другой экземпляр бота', broadcast_id)
+                return
+
+    heartbeat = asyncio.create_task(keep_lease())
+    done = False
+    try:
+        while True:
+            batch = await _next_batch(broadcast_id, last_user_id, broadcast_config.BATCH_SIZE)
+            if not batch:
+                done = True
+                break
+
+            results = []
+            try:
+                await asyncio.gather(*(send(user_id, chat_id, results) for user_id, chat_id in batch))
+            finally:
+                # При остановке сохраняем то, что успели отправить, но курсор не двигаем —
+                # оставшиеся получатели пачки будут найдены при продолжении
+                complete = len(results) == len(batch)
+                saved = await asyncio.shield(
+                    _save_progress(broadcast_id, owner, results, batch[-1][0] if complete else None)
+                )
+                if saved:
+                    for delivery in results:
+                        totals[delivery['status']] += 1
+            if not saved:
+                logger.warning('Рассылка %s остановлена: её продолжает другой экземпляр бота', broadcast_id)
+                break
+            last_user_id = batch[-1][0]
+            logger.info('Рассылка %s: обработано %s получателей', broadcast_id, sum(totals.values()))
+    finally:
+        heartbeat.cancel()
+        # Прерванную рассылку можно продолжить сразу, не дожидаясь истечения аренды
+        values = {'status': 'done', 'finished_at': func.now()} if done else {}
+        await asyncio.shield(_release(broadcast_id, owner, **values))
+
+    report = BroadcastReport(broadcast_id, totals['sent'], totals['failed'], totals['blocked'],
+                             time.monotonic() - started)
+    logger.info('Рассылка %s завершена: отправлено %s, ошибок %s, заблокировали бота %s, %.1f с (%.1f сообщ./с)',
+                broadcast_id, report.sent, report.failed, report.blocked, report.elapsed, report.rate)
+    return report
+
+
+async def resume_broadcasts(bot: Bot) -> List[BroadcastReport]:
+    """Продолжает все незавершённые рассылки, например после перезапуска бота."""
+    async with async_session() as session:
+        ids = (await session.scalars(select(Broadcast.id).where(Broadcast.status == 'running')
+                                     .order_by(Broadcast.id))).all()
+    reports = []
+    for broadcast_id in ids:
+        report = await run_broadcast(bot, broadcast_id)
+        if report is not None:
+            reports.append(report)
+    return reports
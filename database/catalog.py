@@ -0,0 +1,365 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from database.models import (Category, Model, Color, Memory, RMA, ScreenSize, Connectivity, Item, CatalogVersion,
+                             async_session, engine)
+from database.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+def _by_id(rows: Iterable) -> Dict[int, object]:
+    return {row.id: row for row in rows}
+
+
+def _group_by_model(rows: Iterable) -> Dict[int, Tuple]:
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.model_id, []).append(row)
+    return {model_id: tuple(group) for model_id, group in groups.items()}
+
+
+class Variant(NamedTuple):
+    item: Item
+    model: Model
+    color: Color
+    memory: Optional[Memory]
+    ram: Optional[RMA]
+    connectivity: Optional[Connectivity]
+    screen_size: Optional[ScreenSize]
+
+
+# Необязательные атрибуты товара; в ключах индекса каждый из них может быть заменён на None («любой»)
+_OPTIONAL_ATTRIBUTES = ('memory_id', 'ram_id', 'connectivity_id', 'screen_size_id')
+_WILDCARD_MASKS = tuple(itertools.product((False, True), repeat=len(_OPTIONAL_ATTRIBUTES)))
+
+
+def _variant_keys(item: Item) -> Set[Tuple]:
+    values = tuple(getattr(item, attribute) for attribute in _OPTIONAL_ATTRIBUTES)
+    keys = set()
+    for mask in _WILDCARD_MASKS:
+        keys.add((item.model_id, item.color_id) + tuple(None if wildcard else value
+                                                        for wildcard, value in zip(mask, values)))
+    return keys
+
+
+class VariantIndex:
+    """Товары, разложенные по ключу (model, color, memory, ram, connectivity, screen_size).
+
+    Каждый товар записан под всеми комбинациями ключа, где необязательные атрибуты
+    заменены на None, поэтому поиск с неполным выбором — это одно обращение к словарю.
+    Под одним ключом хранятся id товаров по возрастанию, найденным считается первый."""
+
+    __slots__ = ('items', '_variants')
+
+    def __init__(self, items: Dict[int, Item], variants: Dict[Tuple, List[int]]):
+        self.items = items
+        self._variants = variants
+
+    @classmethod
+    def build(cls, items: Iterable[Item]) -> 'VariantIndex':
+        index = cls({}, {})
+        for item in sorted(items, key=lambda row: row.id):
+            index.items[item.id] = item
+            for key in _variant_keys(item):
+                index._variants.setdefault(key, []).append(item.id)
+        return index
+
+    def updated(self, items: Iterable[Item], removed_ids: Iterable[int] = ()) -> 'VariantIndex':
+        """Копия индекса с заменёнными и удалёнными товарами. Копируются только затронутые ключи."""
+        index = VariantIndex(dict(self.items), dict(self._variants))
+        touched = set()
+
+        def bucket(key: Tuple) -> List[int]:
+            if key not in touched:
+                touched.add(key)
+                index._variants[key] = list(index._variants.get(key, ()))
+            return index._variants[key]
+
+        items = list(items)
+        for item_id in itertools.chain(removed_ids, (item.id for item in items)):
+            previous = index.items.pop(item_id, None)
+            if previous is None:
+                continue
+            for key in _variant_keys(previous):
+                bucket(key).remove(item_id)
+
+        for item in items:
+            index.items[item.id] = item
+            for key in _variant_keys(item):
+                bisect.insort(bucket(key), item.id)
+
+        for key in touched:
+            if not index._variants[key]:
+                del index._variants[key]
+        return index
+
+    def lookup(self, model_id: int, color_id: int, memory_id: Optional[int] = None, ram_id: Optional[int] = None,
+               connectivity_id: Optional[int] = None, screen_size_id: Optional[int] = None) -> Optional[Item]:
+        ids = self._variants.get((model_id, color_id, memory_id, ram_id, connectivity_id, screen_size_id))
+        return self.items[ids[0]] if ids else None
+
+
+class CatalogSnapshot:
+    """Срез каталога: справочники и индекс товаров. После создания не изменяется, поэтому его
+    можно безопасно отдавать всем обработчикам одновременно.
+
+    version — локальный номер среза (меняется при любой подмене), source_version — версия каталога
+    в БД (таблица catalog_version), изменения до которой срез уже содержит."""
+
+    __slots__ = ('version', 'source_version', 'categories', 'models', 'models_by_category', 'colors', 'colors_by_model',
+                 'memories', 'memories_by_model', 'rams', 'rams_by_model', 'screen_sizes',
+                 'screen_sizes_by_model', 'connectivities', 'connectivities_by_model', 'variants')
+
+    def __init__(self, version: int, categories: Sequence[Category], models: Sequence[Model],
+                 colors: Sequence[Color], memories: Sequence[Memory], rams: Sequence[RMA],
+                 screen_sizes: Sequence[ScreenSize], connectivities: Sequence[Connectivity],
+                 variants: VariantIndex, source_version: int = 0):
+        self.version = version
+        self.source_version = source_version
+        self.categories = tuple(categories)
+
+        self.models = _by_id(models)
+        models_by_category = {}
+        for model in models:
+            models_by_category.setdefault(model.category_id, []).append(model)
+        self.models_by_category = {key: tuple(group) for key, group in models_by_category.items()}
+
+        self.colors = _by_id(colors)
+        self.colors_by_model = _group_by_model(colors)
+        self.memories = _by_id(memories)
+        self.memories_by_model = _group_by_model(memories)
+        self.rams = _by_id(rams)
+        self.rams_by_model = _group_by_model(rams)
+        self.screen_sizes = _by_id(screen_sizes)
+        self.screen_sizes_by_model = _group_by_model(screen_sizes)
+        self.connectivities = _by_id(connectivities)
+
+        self.variants = variants
+        self.connectivities_by_model = self._connectivities_by_model(variants.items.values())
+
+    def _connectivities_by_model(self, items: Iterable[Item]) -> Dict[int, Tuple]:
+        # Типы подключения не привязаны к модели напрямую — берём их из товаров
+        pairs = {}
+        for item in items:
+            if item.connectivity_id is not None:
+                pairs.setdefault(item.model_id, set()).add(item.connectivity_id)
+        return {model_id: tuple(self.connectivities[connectivity_id] for connectivity_id in sorted(ids))
+                for model_id, ids in pairs.items()}
+
+    def with_items(self, version: int, items: Sequence[Item], removed_ids: Iterable[int] = (),
+                   source_version: Optional[int] = None) -> 'CatalogSnapshot':
+        """Новый срез с обновлёнными товарами; справочники переиспользуются без копирования."""
+        snapshot = object.__new__(CatalogSnapshot)
+        for attribute in self.__slots__:
+            setattr(snapshot, attribute, getattr(self, attribute))
+        snapshot.version = version
+        if source_version is not None:
+            snapshot.source_version = source_version
+        snapshot.variants = self.variants.updated(items, removed_ids)
+        snapshot.connectivities_by_model = snapshot._connectivities_by_model(snapshot.variants.items.values())
+        return snapshot
+
+    def find_variant(self, color_id: int, model_id: Optional[int] = None, memory_id: Optional[int] = None,
+                     ram_id: Optional[int] = None, connectivity_id: Optional[int] = None,
+                     screen_size_id: Optional[int] = None) -> Optional[Variant]:
+        color = self.colors.get(color_id)
+        if color is None:
+            return None
+        item = self.variants.lookup(color.model_id if model_id is None else model_id, color_id,
+                                    memory_id, ram_id, connectivity_id, screen_size_id)
+        if item is None:
+            return None
+        return Variant(item, self.models.get(item.model_id), color, self.memories.get(item.memory_id),
+                       self.rams.get(item.ram_id), self.connectivities.get(item.connectivity_id),
+                       self.screen_sizes.get(item.screen_size_id))
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_stale = False
+_version = 0
+# Счётчик инвалидаций: если каталог сбросили во время загрузки, загруженный срез уже устарел
+_invalidations = 0
+_reload_lock = asyncio.Lock()
+_REFRESH_CHUNK_SIZE = 1000
+# Длительность полных перезагрузок и отставание от БД (в секундах) — для /catalog_status и мониторинга
+_stats = {'reloads': 0, 'last_reload_duration': 0.0, 'max_reload_duration': 0.0,
+          'last_staleness': 0.0, 'max_staleness': 0.0}
+
+
+async def _fetch_snapshot(version: int) -> CatalogSnapshot:
+    async with async_session() as session:
+        # Версию читаем до данных: запись, сделанная во время загрузки, увеличит её ещё раз,
+        # и срез перезагрузится при следующей проверке
+        source_version = await session.scalar(select(CatalogVersion.version).where(CatalogVersion.id == 1)) or 0
+        categories = (await session.scalars(select(Category).order_by(Category.id))).all()
+        models = (await session.scalars(select(Model).order_by(Model.id))).all()
+        colors = (await session.scalars(select(Color).order_by(Color.id))).all()
+        memories = (await session.scalars(select(Memory).order_by(Memory.id))).all()
+        rams = (await session.scalars(select(RMA).order_by(RMA.id))).all()
+        screen_sizes = (await session.scalars(select(ScreenSize).order_by(ScreenSize.id))).all()
+        connectivities = (await session.scalars(select(Connectivity).order_by(Connectivity.id))).all()
+        items = (await session.scalars(select(Item).order_by(Item.id))).all()
+
+    return CatalogSnapshot(version, categories, models, colors, memories, rams, screen_sizes,
+                           connectivities, VariantIndex.build(items), source_version)
+
+
+async def _reload() -> CatalogSnapshot:
+    global _snapshot, _stale, _version
+
+    invalidations = _invalidations
+    started = time.monotonic()
+    snapshot = await _fetch_snapshot(_version + 1)
+    duration = time.monotonic() - started
+    _stats['reloads'] += 1
+    _stats['last_reload_duration'] = duration
+    _stats['max_reload_duration'] = max(_stats['max_reload_duration'], duration)
+
+    # Подмена одной ссылкой: читатели видят либо старый, либо новый срез целиком
+    _version = snapshot.version
+    _snapshot = snapshot
+    _stale = invalidations != _invalidations
+    logger.info('Каталог загружен за %.2f с, версия %s (в БД %s)', duration, snapshot.version, snapshot.source_version)
+    return snapshot
+
+
+async def load_catalog() -> CatalogSnapshot:
+    """Загружает каталог из БД и атомарно подменяет текущий срез."""
+    async with _reload_lock:
+        return await _reload()
+
+
+async def refresh_items(item_ids: Iterable[int], source_version: Optional[int] = None) -> CatalogSnapshot:
+    """Перечитывает из БД только указанные товары (после импорта цен или правки каталога)
+    и подменяет срез копией с обновлённым индексом.
+
+    source_version — версия каталога, которую получила эта запись (bump_catalog_version).
+    Если она следует сразу за версией среза, других изменений не было и полная перезагрузка
+    по CatalogWatcher не нужна."""
+    global _snapshot, _version
+
+    item_ids = set(item_ids)
+    async with _reload_lock:
+        if _snapshot is None:
+            return await _reload()
+
+        items = []
+        ids = sorted(item_ids)
+        async with async_session() as session:
+            for start in range(0, len(ids), _REFRESH_CHUNK_SIZE):
+                chunk = ids[start:start + _REFRESH_CHUNK_SIZE]
+                items.extend((await session.scalars(select(Item).where(Item.id.in_(chunk)))).all())
+
+        removed_ids = item_ids - {item.id for item in items}
+        if source_version != _snapshot.source_version + 1:
+            source_version = None
+        snapshot = _snapshot.with_items(_version + 1, items, removed_ids, source_version)
+        _version = snapshot.version
+        _snapshot = snapshot
+
+    logger.info('Обновлено товаров в каталоге: %s, версия %s', len(item_ids), snapshot.version)
+    return snapshot
+
+
+async def get_catalog() -> CatalogSnapshot:
+    """Текущий срез каталога; при первом обращении или после инвалидации перечитывает БД."""
+    snapshot = _snapshot
+    if snapshot is not None and not _stale:
+        return snapshot
+
+    if snapshot is not None and _reload_lock.locked():
+        # Перезагрузка уже идёт — не ждём её и отдаём прежний срез
+        return snapshot
+
+    async with _reload_lock:
+        # Пока ждали блокировку, срез мог обновить другой обработчик
+        if _snapshot is not None and not _stale:
+            return _snapshot
+        return await _reload()
+
+
+def invalidate_catalog() -> None:
+    """Помечает срез устаревшим: следующее обращение загрузит каталог заново."""
+    global _stale, _invalidations
+    _stale = True
+    _invalidations += 1
+
+
+def catalog_version() -> int:
+    return _version
+
+
+def catalog_stats() -> Dict[str, float]:
+    """Версии среза и метрики перезагрузок: длительность и отставание от БД в секундах."""
+    snapshot = _snapshot
+    return dict(_stats, version=_version, source_version=snapshot.source_version if snapshot is not None else 0)
+
+
+async def bump_catalog_version(connection: Union[AsyncConnection, AsyncSession]) -> int:
+    """Увеличивает версию каталога в транзакции вызывающего кода и возвращает новую версию.
+
+    Вызывается при каждой записи в товары или справочники: после коммита остальные экземпляры
+    бота увидят новую версию и перезагрузят свой срез."""
+    table = CatalogVersion.__table__
+    statement = upsert(engine.dialect.name, table, ['id'],
+                       lambda new: {'version': table.c.version + 1, 'updated_at': func.now()})
+    await connection.execute(statement, {'id': 1, 'version': 1})
+    return await connection.scalar(select(table.c.version).where(table.c.id == 1))
+
+
+class CatalogWatcher:
+    """Раз в interval секунд сверяет версию каталога в БД со срезом и при расхождении
+    загружает новый срез; чтение версии — один запрос по первичному ключу."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def check_once(self) -> bool:
+        """Перезагружает срез, если версия в БД новее; возвращает True, если срез заменён."""
+        async with async_session() as session:
+            row = (await session.execute(
+                select(CatalogVersion.version, CatalogVersion.updated_at, func.now()).where(CatalogVersion.id == 1)
+            )).first()
+        if row is None:
+            return False
+        version, updated_at, db_now = row
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.source_version >= version:
+            return False
+
+        started = time.monotonic()
+        await load_catalog()
+        # Отставание считаем по часам БД: сколько срез не содержал изменение, включая загрузку
+        staleness = max(0.0, (db_now - updated_at).total_seconds()) + time.monotonic() - started
+        _stats['last_staleness'] = staleness
+        _stats['max_staleness'] = max(_stats['max_staleness'], staleness)
+        logger.info('Каталог обновлён до версии %s из БД, отставание %.1f с', version, staleness)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check_once()
+            except Exception:
+                logger.exception('Ошибка при проверке версии каталога')
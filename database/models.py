@@ -1,9 +1,14 @@
-from sqlalchemy import String, BigInteger, ForeignKey, Integer, func, DateTime
+from sqlalchemy import (String, BigInteger, ForeignKey, Integer, func, DateTime, Text, Index, UniqueConstraint,
+                        Numeric, event)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker, AsyncSession
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+from decimal import Decimal
+
+from filters.config import db_config
+from monitoring.sql import instrument_engine
 
 
 # Загрузка переменных окружения
@@ -14,15 +19,40 @@ SQLALCHEMY_URL = os.getenv('SQLALCHEMY_URL')
 if not SQLALCHEMY_URL:
     raise ValueError("SQLALCHEMY_URL is not set in environment variables")
 
-# Создание асинхронного движка SQLAlchemy с пулом соединений
+# Параметры пула не применимы к SQLite (локальная проверка планов запросов, tools/check_query_plans.py)
+pool_options = {} if SQLALCHEMY_URL.startswith('sqlite') else dict(
+    pool_size=db_config.POOL_SIZE,
+    max_overflow=db_config.MAX_OVERFLOW,
+    pool_timeout=db_config.POOL_TIMEOUT,
+)
+
+# Создание асинхронного движка SQLAlchemy с пулом соединений; настройки — в DbConfig (filters/config.py)
 engine = create_async_engine(
     url=SQLALCHEMY_URL,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    pool_recycle=1800,
-    echo=True
+    echo=db_config.ECHO,
+    pool_recycle=db_config.POOL_RECYCLE,
+    pool_pre_ping=db_config.POOL_PRE_PING,
+    **pool_options
 )
+instrument_engine(engine.sync_engine, db_config.SLOW_QUERY_THRESHOLD)
+
+
+@event.listens_for(engine.sync_engine, 'connect')
+def _set_statement_timeout(dbapi_connection, connection_record):
+    # Ограничение времени запроса задаётся для каждого нового соединения пула
+    if not db_config.STATEMENT_TIMEOUT:
+        return
+    statements = {
+        # В MySQL ограничение действует только на SELECT
+        'mysql': f'SET SESSION max_execution_time = {db_config.STATEMENT_TIMEOUT}',
+        'postgresql': f'SET statement_timeout = {db_config.STATEMENT_TIMEOUT}',
+    }
+    statement = statements.get(engine.dialect.name)
+    if statement is None:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(statement)
+    cursor.close()
 
 
 # Создание сессии
@@ -64,6 +94,24 @@ class Order(Base):
 
     # Связь с таблицей users
     user: Mapped["Users"] = relationship('Users', back_populates='orders')
+    # Связь с таблицей order_items
+    items: Mapped[list["OrderItem"]] = relationship('OrderItem', back_populates='order')
+
+    # Заказы пользователя по дате
+    __table_args__ = (Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),)
+
+
+class OrderItem(Base):
+    __tablename__ = 'order_items'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('orders.id'), index=True)
+    item_id: Mapped[int] = mapped_column(Integer, ForeignKey('items.id'))
+    quantity: Mapped[int] = mapped_column(Integer)
+    # Цена на момент заказа: последующие изменения прайса не меняют оформленные заказы
+    price: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+
+    order: Mapped["Order"] = relationship('Order', back_populates='items')
 
 
 class Admin(Base):
@@ -86,7 +134,7 @@ class Model(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(100))
-    category_id: Mapped[int] = mapped_column(Integer, ForeignKey('categories.id'))
+    category_id: Mapped[int] = mapped_column(Integer, ForeignKey('categories.id'), index=True)
     items: Mapped[list["Item"]] = relationship('Item', back_populates='model')
 
 
@@ -95,7 +143,7 @@ class Color(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(50))
-    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'))
+    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'), index=True)
     items: Mapped[list["Item"]] = relationship('Item', back_populates='color')
 
 
@@ -104,7 +152,7 @@ class Memory(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     size: Mapped[str] = mapped_column(String(50))
-    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'))
+    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'), index=True)
 
     # Связь с таблицей items
     items: Mapped[list["Item"]] = relationship('Item', back_populates='memory')
@@ -115,7 +163,7 @@ class RMA(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     size: Mapped[str] = mapped_column(String(50))
-    model_id:  Mapped[int] = mapped_column(Integer, ForeignKey('models.id'))
+    model_id:  Mapped[int] = mapped_column(Integer, ForeignKey('models.id'), index=True)
     items: Mapped[list["Item"]] = relationship('Item', back_populates='ram')
 
 
@@ -124,7 +172,7 @@ class ScreenSize(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     size: Mapped[str] = mapped_column(String(50))
-    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'))
+    model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'), index=True)
 
     # Связь с таблицей items
     items: Mapped[list["Item"]] = relationship('Item', back_populates='screen_size')
@@ -146,7 +194,7 @@ class Item(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(100))
     description: Mapped[str] = mapped_column(String(150))
-    price: Mapped[str] = mapped_column(String(10), nullable=False)
+    price: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
     category_id: Mapped[int] = mapped_column(Integer, ForeignKey('categories.id'))
     model_id: Mapped[int] = mapped_column(Integer, ForeignKey('models.id'))
     color_id: Mapped[int] = mapped_column(Integer, ForeignKey('colors.id'))
@@ -154,7 +202,12 @@ class Item(Base):
     screen_size_id: Mapped[int] = mapped_column(Integer, ForeignKey('screen_sizes.id'), nullable=True)
     connectivity_id: Mapped[int] = mapped_column(Integer, ForeignKey('connectivities.id'), nullable=True)
     image_url: Mapped[str] = mapped_column(String(250), nullable=True)
+    # file_id фото в Telegram после первой загрузки image_url — повторно файл не загружается
+    image_file_id: Mapped[str] = mapped_column(String(255), nullable=True)
     ram_id: Mapped[int] = mapped_column(Integer, ForeignKey('RMA.id'), nullable=True)
+    # Время последнего изменения цены или характеристик — по нему строится выгрузка изменений
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now(),
+                                                 server_default=func.now(), index=True)
 
     # Связь с таблицей basket
     baskets: Mapped[list["Basket"]] = relationship('Basket', back_populates='item')
@@ -176,6 +229,13 @@ class Item(Base):
     # Связь с таблицей memory
     memory: Mapped["Memory"] = relationship('Memory', back_populates='items')
 
+    # Обработчики ищут вариант товара в срезе каталога в памяти (VariantIndex в database/catalog.py), не в БД.
+    # В БД индекс обслуживает внешний ключ items.model_id (MySQL использует его вместо отдельного индекса)
+    # и поиск товаров модели — get_model_by_memory
+    __table_args__ = (
+        Index('ix_items_variant', 'model_id', 'color_id', 'memory_id', 'ram_id', 'connectivity_id', 'screen_size_id'),
+    )
+
 
 class Basket(Base):
     __tablename__ = 'basket'
@@ -188,6 +248,90 @@ class Basket(Base):
     user: Mapped["Users"] = relationship('Users', back_populates='baskets')
     item: Mapped["Item"] = relationship('Item', back_populates='baskets')
 
+    # Одна строка на товар в корзине пользователя — на этом ключе построен upsert в add_item_to_basket
+    __table_args__ = (UniqueConstraint('user_id', 'item_id', name='uq_basket_user_item'),)
+
+
+
+# Состояния FSM и выбор в конфигураторе, общие для всех экземпляров бота (database/storage.py)
+class FsmRecord(Base):
+    __tablename__ = 'fsm_storage'
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    destiny: Mapped[str] = mapped_column(String(50), index=True)
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
+
+# Рассылки и доставка по получателям: прерванная рассылка продолжается с места остановки (database/broadcast.py)
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(20), default='running', index=True)
+    # Пользователи рассылаются по возрастанию users.id; все до last_user_id уже обработаны
+    last_user_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # Рассылку проводит один экземпляр бота: он записывает себя в owner и продлевает аренду,
+    # другие экземпляры берут рассылку только после её истечения (database/broadcast.py)
+    owner: Mapped[str] = mapped_column(String(32), nullable=True)
+    lease_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = 'broadcast_deliveries'
+
+    broadcast_id: Mapped[int] = mapped_column(Integer, ForeignKey('broadcasts.id'), primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('users.id'), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20))
+    attempts: Mapped[int] = mapped_column(Integer, default=1)
+    error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+
+# Версия каталога в БД: каждая запись в справочники или товары увеличивает её в той же транзакции,
+# а все экземпляры бота по ней узнают, что срез каталога в памяти устарел (database/catalog.py)
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now())
+
+
+# Журнал выгрузок прайса: /export_prices since last берёт изменения с начала предыдущей выгрузки
+class PriceExport(Base):
+    __tablename__ = 'price_exports'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Время БД на момент начала выгрузки; изменения, сделанные во время выгрузки, попадут в следующую
+    started_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    since: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+
+
+# Исходящие сообщения, записанные в одной транзакции с заказом и доставляемые в фоне (database/outbox.py)
+class OutboxMessage(Base):
+    __tablename__ = 'outbox'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    payload: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(20), default='pending')
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+    last_error: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+    __table_args__ = (Index('ix_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+
 
 async def async_main():
     async with engine.begin() as conn:
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import OutboxMessage, async_session
+from filters.config import outbox_config
+
+logger = logging.getLogger(__name__)
+
+# Пока сообщение отправляется, другие экземпляры бота его не берут; если процесс упал
+# посреди отправки, по истечении аренды сообщение будет отправлено повторно
+_LEASE = timedelta(minutes=1)
+_wakeup = asyncio.Event()
+
+
+def enqueue(session: AsyncSession, chat_ids: Iterable[int], kind: str, **payload: Any) -> None:
+    """Добавляет сообщения в outbox в рамках транзакции вызывающего кода.
+
+    payload — аргументы bot.send_message (text, parse_mode и т. п.)."""
+    data = json.dumps(payload, ensure_ascii=False)
+    session.add_all([OutboxMessage(kind=kind, chat_id=chat_id, payload=data) for chat_id in chat_ids])
+
+
+def notify_outbox() -> None:
+    """Будит диспетчер сразу после коммита, не дожидаясь очередного опроса."""
+    _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(5 * 2 ** attempts, 3600))
+
+
+async def _claim(limit: int) -> list:
+    async with async_session() as session:
+        # next_attempt_at по умолчанию ставится часами БД — все сроки считаются по ним же,
+        # чтобы расхождение часов или часовых поясов приложения и БД не сдвигало отправку
+        now = await session.scalar(select(func.now()))
+        # Обычный FOR UPDATE, а не SKIP LOCKED (его нет в MySQL 5.7): другой экземпляр бота ждёт
+        # конца этой короткой транзакции и затем читает строки уже с перенесённым сроком
+        rows = (await session.scalars(
+            select(OutboxMessage)
+            .where(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+            .order_by(OutboxMessage.next_attempt_at)
+            .limit(limit)
+            .with_for_update()
+        )).all()
+        # Заблокированная строка читается в последней версии: взятые другим экземпляром отсеиваем
+        messages = [message for message in rows
+                    if message.status == 'pending' and message.next_attempt_at <= now]
+        for message in messages:
+            message.next_attempt_at = now + _LEASE
+        await session.commit()
+    return messages
+
+
+async def _send(bot: Bot, message: OutboxMessage) -> Dict[str, Any]:
+    """Отправляет сообщение; возвращает значения для обновления записи outbox.
+    Срок следующей попытки — retry_in от текущего времени БД, его подставляет dispatch_once."""
+    try:
+        await bot.send_message(chat_id=message.chat_id, **json.loads(message.payload))
+        return {'status': 'sent', 'last_error': None}
+    except TelegramRetryAfter as e:
+        # Ограничение Telegram, а не ошибка сообщения — попытку не засчитываем
+        return {'status': 'pending', 'last_error': e.message,
+                'retry_in': timedelta(seconds=e.retry_after)}
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Повтор не поможет: бот заблокирован или чат не существует
+        return {'status': 'failed', 'last_error': e.message, 'attempts': message.attempts + 1}
+    except TelegramAPIError as e:
+        error = e.message
+    except Exception as e:
+        error = str(e) or type(e).__name__
+
+    attempts = message.attempts + 1
+    if attempts >= outbox_config.MAX_ATTEMPTS:
+        return {'status': 'failed', 'last_error': error, 'attempts': attempts}
+    return {'status': 'pending', 'last_error': error, 'attempts': attempts,
+            'retry_in': _retry_delay(attempts)}
+
+
+class OutboxDispatcher:
+    """Фоновая доставка сообщений из outbox: одновременно до CONCURRENCY отправок, с повторами."""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.semaphore = asyncio.Semaphore(outbox_config.CONCURRENCY)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _deliver(self, message: OutboxMessage) -> Dict[str, Any]:
+        async with self.semaphore:
+            values = await _send(self.bot, message)
+        if values['last_error']:
+            values['last_error'] = values['last_error'][:255]
+        return values
+
+    async def dispatch_once(self) -> int:
+        """Отправляет одну пачку готовых к отправке сообщений; возвращает её размер."""
+        messages = await _claim(outbox_config.BATCH_SIZE)
+        if not messages:
+            return 0
+
+        results = await asyncio.gather(*(self._deliver(message) for message in messages))
+        async with async_session() as session:
+            now = await session.scalar(select(func.now()))
+            for message, values in zip(messages, results):
+                if 'retry_in' in values:
+                    values['next_attempt_at'] = now + values.pop('retry_in')
+                await session.execute(update(OutboxMessage).where(OutboxMessage.id == message.id).values(**values))
+            await session.commit()
+
+        for message, values in zip(messages, results):
+            if values['status'] == 'failed':
+                logger.error('Сообщение outbox %s (%s) в чат %s не доставлено: %s',
+                             message.id, message.kind, message.chat_id, values['last_error'])
+        return len(messages)
+
+    async def _run(self) -> None:
+        while True:
+            _wakeup.clear()
+            try:
+                claimed = await self.dispatch_once()
+            except Exception:
+                logger.exception('Ошибка при разборе outbox')
+                claimed = 0
+
+            # Полная пачка — вероятно, есть ещё готовые сообщения
+            if claimed >= outbox_config.BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(_wakeup.wait(), outbox_config.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,128 @@
+import logging
+import os
+from typing import Dict, NamedTuple, Optional, Set, Union
+
+import aiofiles.os
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
+from sqlalchemy import update
+
+from database.catalog import get_catalog
+from database.models import Item, async_session
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Пути image_url считаются от корня проекта, как папка image/
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Telegram не принимает подпись к фото длиннее 1024 символов — такая карточка показывается текстом
+_MAX_CAPTION = 1024
+
+# image_url -> file_id загруженного фото. Срез каталога хранит file_id на момент загрузки,
+# поэтому новые и сброшенные (None) file_id берутся отсюда
+_file_ids: Dict[str, Optional[str]] = {}
+# Картинки, которых нет на диске: не проверяем файл при каждом показе карточки, до /warm_photos
+_missing: Set[str] = set()
+
+
+class PhotoWarmupReport(NamedTuple):
+    uploaded: int
+    cached: int
+    missing: int
+    failed: int
+
+
+async def item_photo(item: Item) -> Optional[Union[str, FSInputFile]]:
+    """Что отправить как фото товара: file_id, если картинка уже загружалась, иначе файл с диска.
+    None — у товара нет картинки или файла нет на диске."""
+    image_url = item.image_url
+    if not image_url:
+        return None
+    file_id = _file_ids[image_url] if image_url in _file_ids else item.image_file_id
+    if file_id:
+        return file_id
+    if image_url in _missing:
+        return None
+
+    path = os.path.join(_ROOT, image_url)
+    if not await aiofiles.os.path.isfile(path):
+        logger.warning('Нет файла картинки %s', path)
+        _missing.add(image_url)
+        return None
+    return FSInputFile(path)
+
+
+async def _store_file_id(image_url: str, file_id: Optional[str]) -> None:
+    _file_ids[image_url] = file_id
+    async with async_session() as session:
+        # updated_at не меняется: загрузка фото — не изменение товара и не попадает в выгрузку изменений
+        await session.execute(update(Item).where(Item.image_url == image_url)
+                              .values(image_file_id=file_id, updated_at=Item.updated_at))
+        await session.commit()
+
+
+async def send_item_photo(bot: Bot, chat_id: int, item: Item, caption: str,
+                          reply_markup: Optional[InlineKeyboardMarkup] = None) -> Optional[Message]:
+    """Отправляет фото товара с подписью. Первая отправка загружает файл и запоминает его file_id
+    в памяти и в БД, следующие передают только file_id. None — фото нет, карточку надо показать текстом."""
+    if len(caption) > _MAX_CAPTION:
+        return None
+    photo = await item_photo(item)
+    if photo is None:
+        return None
+
+    try:
+        sent = await bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if not isinstance(photo, str):
+            # Telegram не принял сам файл (формат, размер) — карточка покажется текстом
+            logger.warning('Не удалось загрузить картинку %s: %s', item.image_url, e.message)
+            return None
+        # file_id перестал приниматься (например, сменили токен бота) — загружаем файл заново
+        logger.warning('file_id картинки %s отклонён: %s', item.image_url, e.message)
+        await _store_file_id(item.image_url, None)
+        # Без file_id повторная отправка загружает файл с диска
+        return await send_item_photo(bot, chat_id, item, caption, reply_markup)
+
+    if not isinstance(photo, str):
+        await _store_file_id(item.image_url, sent.photo[-1].file_id)
+    return sent
+
+
+async def warm_up_photos(bot: Bot, chat_id: int, rate: float) -> PhotoWarmupReport:
+    """Загружает в Telegram картинки каталога, у которых ещё нет file_id, отправляя их в служебный чат,
+    чтобы первый покупатель не ждал загрузки файла."""
+    _missing.clear()
+    images: Dict[str, Item] = {}
+    for item in (await get_catalog()).variants.items.values():
+        if item.image_url:
+            images.setdefault(item.image_url, item)
+
+    bucket = TokenBucket(rate)
+    uploaded = cached = missing = failed = 0
+    for image_url, item in images.items():
+        photo = await item_photo(item)
+        if photo is None:
+            missing += 1
+            continue
+        if isinstance(photo, str):
+            cached += 1
+            continue
+
+        while True:
+            await bucket.acquire()
+            try:
+                sent = await bot.send_photo(chat_id, photo, caption=image_url, disable_notification=True)
+            except TelegramRetryAfter as e:
+                bucket.pause(e.retry_after)
+                continue
+            except TelegramAPIError as e:
+                logger.warning('Не удалось загрузить картинку %s: %s', image_url, e.message)
+                failed += 1
+                break
+            await _store_file_id(image_url, sent.photo[-1].file_id)
+            uploaded += 1
+            break
+
+    return PhotoWarmupReport(uploaded, cached, missing, failed)
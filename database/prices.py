@@ -0,0 +1,258 @@
+import csv
+import gzip
+import io
+import logging
+import tempfile
+from datetime import datetime
+from typing import AsyncGenerator, Dict, Iterator, List, Optional, Set, Tuple
+
+from aiogram.types import InputFile
+from sqlalchemy import (Column, DateTime, Integer, MetaData, Numeric, Table, bindparam, func, insert, select, text,
+                        update)
+
+from database.catalog import bump_catalog_version
+from database.models import Item, PriceExport, async_session, engine
+from filters.config import prices_config
+from utils.blocking import run_blocking
+from utils.prices import format_price, parse_price
+
+logger = logging.getLogger(__name__)
+
+# Временная таблица живёт только в соединении импорта, поэтому параллельные импорты не мешают друг другу
+_staging = Table(
+    'price_import_staging', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('price', Numeric(12, 2), nullable=False),
+    Column('line', Integer, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+
+class PriceImportReport:
+    """Итог импорта прайса: сколько цен изменилось и какие строки файла не применены."""
+
+    def __init__(self):
+        self.rows = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.changed_ids: List[int] = []
+        # (номер строки файла, причина)
+        self.errors: List[Tuple[int, str]] = []
+        # Версия каталога после импорта (None, если цены не менялись)
+        self.catalog_version: Optional[int] = None
+
+    @property
+    def applied(self) -> int:
+        return self.updated + self.unchanged
+
+
+def _read_rows(path: str, report: PriceImportReport) -> Iterator[Dict]:
+    """Построчно читает CSV и отдаёт разобранные строки; ошибки записывает в отчёт."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f, delimiter=';')
+        headers = next(reader, [])
+        if 'Цена' not in headers or 'ID' not in headers:
+            raise ValueError("Файл должен содержать колонки 'ID' и 'Цена'")
+        price_col = headers.index('Цена')
+        id_col = headers.index('ID')
+
+        seen: Set[int] = set()
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            report.rows += 1
+            line = reader.line_num
+            if len(row) <= max(price_col, id_col):
+                report.errors.append((line, 'не хватает колонок'))
+                continue
+            try:
+                item_id = int(row[id_col])
+            except ValueError:
+                report.errors.append((line, f'некорректный ID: {row[id_col]!r}'))
+                continue
+            try:
+                price = parse_price(row[price_col])
+            except ValueError as e:
+                report.errors.append((line, str(e)))
+                continue
+            if item_id in seen:
+                report.errors.append((line, f'ID {item_id} уже встречался в файле'))
+                continue
+            seen.add(item_id)
+            yield {'id': item_id, 'price': price, 'line': line}
+
+
+def _chunks(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_prices(path: str) -> PriceImportReport:
+    """Импортирует цены из CSV (колонки «ID» и «Цена», разделитель «;»).
+
+    Файл читается потоково и пачками грузится во временную таблицу, после чего изменившиеся
+    цены применяются одним UPDATE ... JOIN — items блокируется только на время этого запроса."""
+    report = PriceImportReport()
+    items = Item.__table__
+
+    async with engine.connect() as connection:
+        await connection.run_sync(_staging.create)
+        # Чтение и разбор CSV идут в пуле потоков по пачке за раз, цикл событий занят только запросами
+        chunks = _chunks(_read_rows(path, report), prices_config.IMPORT_CHUNK_SIZE)
+        try:
+            while (chunk := await run_blocking(next, chunks, None)) is not None:
+                await connection.execute(insert(_staging), chunk)
+                await connection.commit()
+
+            unknown = await connection.execute(
+                select(_staging.c.id, _staging.c.line)
+                .outerjoin(items, items.c.id == _staging.c.id)
+                .where(items.c.id.is_(None))
+                .order_by(_staging.c.line)
+            )
+            report.errors.extend((line, f'товар с ID {item_id} не найден') for item_id, line in unknown)
+
+            changed = items.c.price != _staging.c.price
+            report.changed_ids = list(await connection.scalars(
+                select(items.c.id).join(_staging, _staging.c.id == items.c.id).where(changed)
+            ))
+            result = await connection.execute(
+                update(items).where(items.c.id == _staging.c.id, changed).values(price=_staging.c.price)
+            )
+            if result.rowcount:
+                report.catalog_version = await bump_catalog_version(connection)
+            await connection.commit()
+            report.updated = result.rowcount
+            report.unchanged = report.rows - len(report.errors) - report.updated
+        finally:
+            await run_blocking(chunks.close)
+            await connection.run_sync(_staging.drop)
+            await connection.commit()
+
+    report.errors.sort()
+    logger.info('Импорт цен: строк %s, изменено %s, без изменений %s, ошибок %s',
+                report.rows, report.updated, report.unchanged, len(report.errors))
+    return report
+
+
+_EXPORT_SQL = """
+SELECT
+    i.id,
+    c.name AS category,
+    m.name AS model,
+    cl.name AS color,
+    mem.size AS memory,
+    ss.size AS screen_size,
+    conn.type AS connectivity,
+    r.size AS ram,
+    i.price
+FROM items i
+LEFT JOIN categories c ON i.category_id = c.id
+LEFT JOIN models m ON i.model_id = m.id
+LEFT JOIN colors cl ON i.color_id = cl.id
+LEFT JOIN memory mem ON i.memory_id = mem.id
+LEFT JOIN screen_sizes ss ON i.screen_size_id = ss.id
+LEFT JOIN connectivities conn ON i.connectivity_id = conn.id
+LEFT JOIN RMA r ON i.ram_id = r.id
+{where}
+ORDER BY {order}
+"""
+
+_EXPORT_QUERY = text(_EXPORT_SQL.format(where='', order='i.id'))
+# Изменения упорядочены по времени: индекс ix_items_updated_at отдаёт их уже отсортированными, без
+# просмотра всей таблицы. Границу включаем: изменение в ту же секунду, что и начало прошлой выгрузки,
+# лучше выгрузить дважды, чем потерять
+_EXPORT_CHANGED_QUERY = text(
+    _EXPORT_SQL.format(where='WHERE i.updated_at >= :since', order='i.updated_at, i.id')
+).bindparams(bindparam('since', type_=DateTime))
+
+_EXPORT_HEADERS = ["ID", "Категория", "Модель", "Цвет", "Память", "Экран", "Подключение", "RAM", "Цена"]
+
+
+class SpooledInputFile(InputFile):
+    """Файл для отправки в Telegram из буфера в памяти: отдаётся частями, без копирования в bytes."""
+
+    def __init__(self, buffer: tempfile.SpooledTemporaryFile, filename: str):
+        super().__init__(filename=filename)
+        self.buffer = buffer
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        # Большой буфер мог уйти на диск, поэтому читаем его в пуле потоков
+        await run_blocking(self.buffer.seek, 0)
+        while chunk := await run_blocking(self.buffer.read, self.chunk_size):
+            yield chunk
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+def _open_export(compress: bool):
+    buffer = tempfile.SpooledTemporaryFile(max_size=prices_config.EXPORT_SPOOL_SIZE)
+    raw = gzip.GzipFile(fileobj=buffer, mode='wb') if compress else buffer
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    writer = csv.writer(stream, delimiter=';')
+    writer.writerow(_EXPORT_HEADERS)
+    return buffer, raw, stream, writer
+
+
+def _write_rows(writer, partition) -> None:
+    writer.writerows(
+        [item.id, item.category, item.model, item.color, item.memory, item.screen_size,
+         item.connectivity, item.ram, format_price(item.price)]  # Цена всегда в последней колонке
+        for item in partition
+    )
+
+
+def _close_export(raw, stream, compress: bool) -> None:
+    stream.flush()
+    # Отсоединяем обёртку, чтобы её закрытие не закрыло буфер; gzip дописывает хвост при закрытии
+    stream.detach()
+    if compress:
+        raw.close()
+
+
+async def last_export_time() -> Optional[datetime]:
+    """Время начала последней выгрузки прайса (по часам БД) или None, если выгрузок не было."""
+    async with async_session() as session:
+        return await session.scalar(select(func.max(PriceExport.started_at)))
+
+
+async def export_prices(compress: bool = False,
+                        since: Optional[datetime] = None) -> Tuple[SpooledInputFile, int]:
+    """Выгружает прайс в CSV (разделитель «;»), при compress — сжатый gzip; возвращает файл и число строк.
+
+    С since выгружаются только товары, изменённые начиная с этого момента (по часам БД).
+    Строки читаются из БД курсором на стороне сервера пачками и сразу пишутся в буфер,
+    который остаётся в памяти, пока не превысит EXPORT_SPOOL_SIZE. Каждый вызов получает
+    свой буфер, поэтому одновременные выгрузки не мешают друг другу. Кодирование CSV и сжатие
+    выполняются в пуле потоков. Каждая выгрузка записывается в журнал price_exports."""
+    buffer, raw, stream, writer = await run_blocking(_open_export, compress)
+
+    rows = 0
+    async with async_session() as session:
+        # Время берём у БД, с которой сравнивается items.updated_at, и до чтения строк
+        started_at = await session.scalar(select(func.now()))
+        if since is None:
+            result = await session.stream(_EXPORT_QUERY)
+        else:
+            result = await session.stream(_EXPORT_CHANGED_QUERY, {'since': since})
+        async for partition in result.partitions(prices_config.EXPORT_BATCH_SIZE):
+            await run_blocking(_write_rows, writer, partition)
+            rows += len(partition)
+
+        session.add(PriceExport(started_at=started_at, since=since, rows=rows))
+        await session.commit()
+
+    await run_blocking(_close_export, raw, stream, compress)
+
+    suffix = "_changes" if since is not None else ""
+    filename = f"prices{suffix}_{datetime.now():%Y%m%d_%H%M%S}.csv" + (".gz" if compress else "")
+    logger.info('Экспорт цен%s: %s строк, %s байт',
+                f' с {since:%Y-%m-%d %H:%M:%S}' if since is not None else '', rows, buffer.tell())
+    return SpooledInputFile(buffer, filename), rows
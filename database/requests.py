@@ -1,65 +1,63 @@
 import logging
+from collections import OrderedDict
 from sqlalchemy.exc import SQLAlchemyError
 from aiogram import Bot
 from database.models import (Category, Item, Basket, Model, Color, Memory, async_session, ScreenSize,
-                             Connectivity, RMA, Users)
-from sqlalchemy import select, delete
-from typing import List
+                             Connectivity, RMA, Users, Order, OrderItem)
+from sqlalchemy import func, select, delete, insert, literal
+from sqlalchemy.orm import aliased
+from typing import Callable, List, NamedTuple, Optional, Sequence
 from filters.config import ADMIN_IDS
+from database.catalog import Variant, get_catalog
+from database.outbox import enqueue, notify_outbox
+from database.upsert import upsert
+from database.broadcast import BroadcastReport, create_broadcast, run_broadcast
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 
-async def get_categories() -> List[Category]:
-    async with async_session() as session:
-        return await session.scalars(select(Category))
+# Справочники каталога читаются из среза в памяти (database/catalog.py), а не из БД
+async def get_categories() -> Sequence[Category]:
+    return (await get_catalog()).categories
 
 
-async def get_models_by_category(category_id: int) -> List[Model]:
-    async with async_session() as session:
-        return await session.scalars(select(Model).where(Model.category_id == category_id))
+async def get_models_by_category(category_id: int) -> Sequence[Model]:
+    return (await get_catalog()).models_by_category.get(category_id, ())
 
 
-async def get_models_colors(model_id: int) -> List[Color]:
-    async with async_session() as session:
-        return await session.scalars(select(Color).where(Color.model_id == model_id))
+async def get_models_colors(model_id: int) -> Sequence[Color]:
+    return (await get_catalog()).colors_by_model.get(model_id, ())
 
 
 # Функция используется для получения одной модели по ее id.
-async def get_model(model_id: int) -> Model:
-    async with async_session() as session:
-        return await session.get(Model, model_id)
+async def get_model(model_id: int) -> Optional[Model]:
+    return (await get_catalog()).models.get(model_id)
 
 
 async def get_all_models() -> List[Model]:
-    async with async_session() as session:
-        return await session.execute(select(Model)).scalars().all()
+    return list((await get_catalog()).models.values())
 
 
-async def get_memory(memory_id: int) -> Memory:
-    async with async_session() as session:
-        return await session.get(Memory, memory_id)
+async def get_memory(memory_id: int) -> Optional[Memory]:
+    return (await get_catalog()).memories.get(memory_id)
 
 
-async def get_memories_by_model(model_id: int) -> List[Memory]:
-    async with async_session() as session:
-        return await session.scalars(select(Memory).where(Memory.model_id == model_id))
+async def get_memories_by_model(model_id: int) -> Sequence[Memory]:
+    return (await get_catalog()).memories_by_model.get(model_id, ())
 
 
-async def get_model_by_color(color_id: int) -> Model:
-    async with async_session() as session:
-        subquery = select(Color.model_id).where(Color.id == color_id).scalar_subquery()
-        return await session.scalar(select(Model).where(Model.id == subquery))
+async def get_model_by_color(color_id: int) -> Optional[Model]:
+    catalog = await get_catalog()
+    color = catalog.colors.get(color_id)
+    return catalog.models.get(color.model_id) if color else None
 
 
-async def get_color(color_id: int) -> Color:
-    async with async_session() as session:
-        return await session.get(Color, color_id)
+async def get_color(color_id: int) -> Optional[Color]:
+    return (await get_catalog()).colors.get(color_id)
 
 
-async def get_screen_sizes_by_model(model_id: int) -> List[ScreenSize]:
-    async with async_session() as session:
-        return await session.scalars(select(ScreenSize).where(ScreenSize.model_id == model_id))
+async def get_screen_sizes_by_model(model_id: int) -> Sequence[ScreenSize]:
+    return (await get_catalog()).screen_sizes_by_model.get(model_id, ())
 
 
 async def get_model_by_memory(memory_id: int) -> Item:
@@ -68,163 +66,148 @@ async def get_model_by_memory(memory_id: int) -> Item:
         return await session.scalar(select(Item).where(Item.model_id == model_id))
 
 
-async def get_color_by_model(model_id: int) -> Color:
-    async with async_session() as session:
-        subquery = select(Color.id).where(Color.model_id == model_id).limit(1).scalar_subquery()
-        return await session.scalar(select(Color).where(Color.id == subquery))
-
-
-async def get_ram(ram_id: int) -> RMA:
-    async with async_session() as session:
-        return await session.scalar(select(RMA).where(RMA.id == ram_id))
+async def get_color_by_model(model_id: int) -> Optional[Color]:
+    colors = (await get_catalog()).colors_by_model.get(model_id)
+    return colors[0] if colors else None
 
 
-async def get_rams_by_model(model_id: int) -> List[RMA]:
-    async with async_session() as session:
-        return await session.scalars(select(RMA).where(RMA.model_id == model_id))
+async def get_ram(ram_id: int) -> Optional[RMA]:
+    return (await get_catalog()).rams.get(ram_id)
 
 
-async def get_screen_size(screen_size_id: int) -> ScreenSize:
-    async with async_session() as session:
-        result = await session.execute(select(ScreenSize).where(ScreenSize.id == screen_size_id))
-        return result.scalar_one_or_none()
+async def get_rams_by_model(model_id: int) -> Sequence[RMA]:
+    return (await get_catalog()).rams_by_model.get(model_id, ())
 
 
-async def get_item_by_memory_and_color(memory_size, color_id):
-    async with async_session() as session:
-        item = await session.execute(
-            select(Item)
-            .join(Model, Item.model_id == Model.id)
-            .join(Memory, Item.memory_id == Memory.id)
-            .join(Color, Item.color_id == Color.id)
-            .filter(Memory.size >= memory_size)
-            .filter(Color.id == color_id)
-            .order_by(Memory.size)
-            .limit(1)
-        )
-        return item.scalar_one_or_none()
+async def get_screen_size(screen_size_id: int) -> Optional[ScreenSize]:
+    return (await get_catalog()).screen_sizes.get(screen_size_id)
 
 
-async def get_item_by_model_memory_color_and_ram(model_id: int, memory_id: int, color_id: int, ram_id: int) -> Item:
-    async with async_session() as session:
-        return await session.scalar(
-            select(Item)
-            .where(Item.model_id == model_id)
-            .where(Item.memory_id == memory_id)
-            .where(Item.color_id == color_id)
-            .where(RMA.id == ram_id)
-            .where(Item.model_id == RMA.model_id)
-        )
+async def get_connectivities_by_model(model_id: int) -> Sequence[Connectivity]:
+    return (await get_catalog()).connectivities_by_model.get(model_id, ())
 
 
-async def get_item_by_memory_color_and_model(memory_id: int, color_id: int, model_id: int) -> Item:
-    async with async_session() as session:
-        return await session.scalar(
-            select(Item)
-            .where(Item.memory_id == memory_id)
-            .where(Item.color_id == color_id)
-            .where(Item.model_id == model_id)
-        )
+async def get_connectivity(connectivity_id: int) -> Optional[Connectivity]:
+    return (await get_catalog()).connectivities.get(connectivity_id)
 
 
-async def get_connectivities_by_model(model_id: int) -> List[Connectivity]:
-    async with async_session() as session:
-        return await session.scalars(
-            select(Connectivity)
-            .join(Item, Connectivity.items)
-            .where(Item.model_id == model_id)
-            .distinct()
-        )
+# Подбор товара по выбору пользователя в конфигураторе: поиск по индексу товаров в памяти.
+# Цвет привязан к модели, поэтому model_id можно не передавать; не переданные атрибуты — любые.
+async def resolve_variant(color_id: int, model_id: Optional[int] = None, memory_id: Optional[int] = None,
+                          ram_id: Optional[int] = None, connectivity_id: Optional[int] = None,
+                          screen_size_id: Optional[int] = None) -> Optional[Variant]:
+    return (await get_catalog()).find_variant(color_id, model_id, memory_id, ram_id, connectivity_id,
+                                              screen_size_id)
 
 
-async def get_connectivity(connectivity_id: int) -> Connectivity:
-    async with async_session() as session:
-        result = await session.execute(select(Connectivity).where(Connectivity.id == connectivity_id))
-        return result.scalar_one_or_none()
+# Обработка корзины
+class _KnownUsers:
+    """id пользователей, чья запись в users уже точно есть: для них добавление в корзину обходится
+    одним запросом. Хранится не больше max_entries id, давно не обращавшиеся вытесняются и при
+    следующем добавлении в корзину проверяются заново. Пользователи не удаляются, поэтому без TTL."""
 
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._ids: 'OrderedDict[int, None]' = OrderedDict()
 
-async def get_item_by_memory_color_model_and_connectivity(memory_id: int,
-                                                          color_id: int, model_id: int, connectivity_id: int) -> Item:
-    async with async_session() as session:
-        result = await session.execute(
-            select(Item)
-            .where(Item.memory_id == memory_id)
-            .where(Item.color_id == color_id)
-            .where(Item.model_id == model_id)
-            .where(Item.connectivity_id == connectivity_id)
-        )
-        return result.scalar_one_or_none()
+    def __contains__(self, user_id: int) -> bool:
+        if user_id not in self._ids:
+            return False
+        self._ids.move_to_end(user_id)
+        return True
 
+    def __len__(self) -> int:
+        return len(self._ids)
 
-async def get_item_by_screen_size_color_and_model(screen_size_id: int, color_id: int, model_id: int) -> Item:
-    async with async_session() as session:
-        result = await session.execute(
-            select(Item)
-            .where(Item.screen_size_id == screen_size_id)
-            .where(Item.color_id == color_id)
-            .where(Item.model_id == model_id)
-        )
-        return result.scalar_one_or_none()
+    def add(self, user_id: int) -> None:
+        self._ids[user_id] = None
+        self._ids.move_to_end(user_id)
+        while len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
 
 
-async def get_item_by_color_and_model(color_id: int, model_id: int) -> Item:
-    async with async_session() as session:
-        result = await session.execute(
-            select(Item)
-            .where(Item.color_id == color_id)
-            .where(Item.model_id == model_id)
-        )
-        return result.scalar_one_or_none()
+_known_users = _KnownUsers(max_entries=10000)
 
 
-# Обработка корзины
 async def add_item_to_basket(user_id: int, item_id: int, quantity: int = 1):
-    async with async_session() as session:
-        # Проверка наличия пользователя и создание, если он не существует
-        user = await session.get(Users, user_id)
-        if not user:
-            user = Users(id=user_id, username=f"user_{user_id}", userphone=None, telegram_id=None, email=None)
-            session.add(user)
-            await session.commit()
-
-        # Проверка наличия товара
-        item = await session.get(Item, item_id)
-        if not item:
-            return False
-
-        # Проверка наличия товара в корзине
-        basket_item = await session.execute(
-            select(Basket).where(Basket.user_id == user_id).where(Basket.item_id == item_id)
-        )
-        basket_item = basket_item.scalar_one_or_none()
-
-        if basket_item:
-            # Обновление количества товара в корзине
-            basket_item.quantity += quantity
-        else:
-            # Добавление нового товара в корзину
-            basket_item = Basket(user_id=user_id, item_id=item_id, quantity=quantity)
-            session.add(basket_item)
+    # Проверка наличия товара по срезу каталога, без запроса к БД
+    if item_id not in (await get_catalog()).variants.items:
+        return False
 
+    async with async_session() as session:
+        if user_id not in _known_users:
+            # Проверка наличия пользователя и создание, если он не существует
+            user = await session.get(Users, user_id)
+            if not user:
+                session.add(Users(id=user_id, username=f"user_{user_id}", userphone=None, telegram_id=None, email=None))
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # Пользователя одновременно создал параллельный запрос
+                    await session.rollback()
+            _known_users.add(user_id)
+
+        # Добавление товара или увеличение количества — один запрос, без потерь при двойном нажатии
+        statement = upsert(session.get_bind().dialect.name, Basket.__table__, ['user_id', 'item_id'],
+                           lambda new: {'quantity': Basket.__table__.c.quantity + new.quantity})
+        await session.execute(statement, {'user_id': user_id, 'item_id': item_id, 'quantity': quantity})
         await session.commit()
         return True
 
 
+def _join_variant(statement):
+    # Справочники варианта товара для строк корзины и заказа; statement уже содержит Item
+    return (
+        statement
+        .join(Model, Item.model_id == Model.id)
+        .join(Color, Item.color_id == Color.id)
+        .outerjoin(ScreenSize, Item.screen_size_id == ScreenSize.id)
+        .outerjoin(Memory, Item.memory_id == Memory.id)
+        .outerjoin(Connectivity, Item.connectivity_id == Connectivity.id)
+        .outerjoin(RMA, Item.ram_id == RMA.id)
+    )
+
+
+def _basket_query(user_id: int):
+    subtotal = Item.price * Basket.quantity
+    # Итог по корзине — скалярным подзапросом в том же запросе (оконные функции есть только с MySQL 8);
+    # псевдонимы не дают подзапросу сослаться на строку внешнего запроса
+    basket, item = aliased(Basket), aliased(Item)
+    total = (
+        select(func.sum(item.price * basket.quantity))
+        .select_from(basket)
+        .join(item, basket.item_id == item.id)
+        .where(basket.user_id == user_id)
+        .scalar_subquery()
+    )
+    return _join_variant(
+        select(Basket, Item, Model, Color, ScreenSize, Memory, Connectivity, RMA, subtotal.label('subtotal'),
+               total.label('total'))
+        .join(Item, Basket.item_id == Item.id)
+    ).where(Basket.user_id == user_id).order_by(Basket.id)
+
+
+def _order_items_query(order_id: int):
+    # Строки заказа в том же виде, что строки корзины, но с количеством и ценой из order_items
+    subtotal = OrderItem.price * OrderItem.quantity
+    order_item = aliased(OrderItem)
+    total = (
+        select(func.sum(order_item.price * order_item.quantity))
+        .where(order_item.order_id == order_id)
+        .scalar_subquery()
+    )
+    return _join_variant(
+        select(OrderItem, Item, Model, Color, ScreenSize, Memory, Connectivity, RMA, subtotal.label('subtotal'),
+               total.label('total'))
+        .join(Item, OrderItem.item_id == Item.id)
+    ).where(OrderItem.order_id == order_id).order_by(OrderItem.id)
+
+
 # Функция для получения товаров из корзины:
+# кроме строк возвращает сумму по каждой строке (subtotal, считается в БД) и итог по корзине (total)
 async def get_basket_items(user_id: int):
     async with async_session() as session:
-        result = await session.execute(
-            select(Basket, Item, Model, Color, ScreenSize, Memory, Connectivity, RMA)
-            .join(Item, Basket.item_id == Item.id)
-            .join(Model, Item.model_id == Model.id)
-            .join(Color, Item.color_id == Color.id)
-            .outerjoin(ScreenSize, Item.screen_size_id == ScreenSize.id)
-            .outerjoin(Memory, Item.memory_id == Memory.id)
-            .outerjoin(Connectivity, Item.connectivity_id == Connectivity.id)
-            .outerjoin(RMA, Item.ram_id == RMA.id)
-            .where(Basket.user_id == user_id)
-        )
-        return result.all()
+        return (await session.execute(_basket_query(user_id))).all()
 
 
 # Функция для удаления товара из корзины:
@@ -248,6 +231,60 @@ async def clear_basket(user_id: int):
         await session.commit()
 
 
+class CheckoutResult(NamedTuple):
+    # ok — заказ оформлен; empty — корзина пуста; changed — корзина изменилась во время оформления
+    status: str
+    order_id: Optional[int] = None
+    # Строки заказа в формате get_basket_items (первым элементом — OrderItem)
+    items: Sequence = ()
+
+
+async def checkout(user_id: int, data: dict,
+                   format_items: Optional[Callable[[list], str]] = None) -> CheckoutResult:
+    """Оформляет заказ одной транзакцией: заказ, строки заказа из корзины, уведомления
+    администраторам в outbox и очистка корзины. format_items превращает записанные строки заказа
+    в текст для уведомления администраторам (data['items'])."""
+    async with async_session() as session:
+        # Блокируем строки корзины до конца транзакции: повторное нажатие или второе устройство
+        # дождётся коммита и увидит уже пустую корзину
+        basket_ids = (await session.scalars(
+            select(Basket.id).where(Basket.user_id == user_id).with_for_update()
+        )).all()
+        if not basket_ids:
+            return CheckoutResult('empty')
+
+        order = Order(user_id=user_id, name=data['name'], address=data['address'], phone=data['phone'],
+                      email=data['email'], delivery_datetime=data['delivery_datetime'])
+        session.add(order)
+        await session.flush()
+
+        # Строки заказа переносятся из корзины одним INSERT ... SELECT вместе со снимком цены
+        result = await session.execute(
+            insert(OrderItem).from_select(
+                ['order_id', 'item_id', 'quantity', 'price'],
+                select(literal(order.id), Basket.item_id, Basket.quantity, Item.price)
+                .join(Item, Basket.item_id == Item.id)
+                .where(Basket.id.in_(basket_ids))
+                .order_by(Basket.id)
+            )
+        )
+        # Без блокировки строк (SQLite не поддерживает FOR UPDATE) корзину могли изменить между чтением и переносом
+        if result.rowcount != len(basket_ids):
+            await session.rollback()
+            return CheckoutResult('changed')
+        await session.execute(delete(Basket).where(Basket.id.in_(basket_ids)))
+
+        # Подтверждение и уведомления строятся из записанных строк заказа, а не из отдельного чтения корзины
+        rows = (await session.execute(_order_items_query(order.id))).all()
+        if format_items is not None:
+            data['items'] = format_items(rows)
+        notify_admins(session, data)
+        await session.commit()
+
+    notify_outbox()
+    return CheckoutResult('ok', order.id, rows)
+
+
 async def create_user_if_not_exists(session: AsyncSession, telegram_id: int, username: str):
     try:
         async with session.begin():
@@ -288,23 +325,22 @@ async def get_all_users():
         raise
 
 
-async def notify_admins(bot: Bot, order_data: dict):
-    for admin_id in ADMIN_IDS:
-        message_text = (
-            f"Новый заказ оформлен!\n"
-            f"ФИО: {order_data['name']}\n"
-            f"Адрес доставки: {order_data['address']}\n"
-            f"Номер телефона: {order_data['phone']}\n"
-            f"Email: {order_data['email']}\n"
-            f"Желаемая дата и время доставки: {order_data['delivery_datetime']}\n\n"
-            f"Товары в заказе:\n"
-            f"{order_data['items']}"
-        )
-        await bot.send_message(admin_id, message_text)
-
-
-async def send_message_to_all_users(bot: Bot, message_text: str):
-    users = await get_all_users()
-    for user in users:
-        if user.telegram_id:  # Проверка на наличие telegram_id
-            await bot.send_message(chat_id=user.telegram_id, text=message_text)
+def notify_admins(session: AsyncSession, order_data: dict) -> None:
+    """Ставит уведомления о заказе в outbox в транзакции заказа; после коммита их доставит OutboxDispatcher."""
+    message_text = (
+        f"Новый заказ оформлен!\n"
+        f"ФИО: {order_data['name']}\n"
+        f"Адрес доставки: {order_data['address']}\n"
+        f"Номер телефона: {order_data['phone']}\n"
+        f"Email: {order_data['email']}\n"
+        f"Желаемая дата и время доставки: {order_data['delivery_datetime']}\n\n"
+        f"Товары в заказе:\n"
+        f"{order_data['items']}"
+    )
+    enqueue(session, ADMIN_IDS, 'admin_order', text=message_text)
+
+
+async def send_message_to_all_users(bot: Bot, message_text: str) -> Optional[BroadcastReport]:
+    # Пачками с ограничением скорости и повторами; прерванную рассылку продолжает resume_broadcasts
+    broadcast_id = await create_broadcast(message_text)
+    return await run_broadcast(bot, broadcast_id)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.models import FsmRecord, async_session
+from database.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ('destiny', 'state', 'data')
+
+    def __init__(self, destiny: str, state: Optional[str], data: Dict[str, Any]):
+        self.destiny = destiny
+        self.state = state
+        self.data = data
+
+
+class SqlStorage(BaseStorage):
+    """FSM-хранилище aiogram в таблице fsm_storage, общее для нескольких экземпляров бота.
+
+    Изменения попадают в очередь, которая раз в flush_interval секунд записывается в БД одним
+    запросом. В памяти процесса лежат только эти ещё не записанные изменения: всё остальное
+    читается из БД, поэтому другой экземпляр увидит изменение не позже чем через flush_interval."""
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession] = async_session,
+                 key_builder: Optional[KeyBuilder] = None, flush_interval: float = 0.05):
+        self.session_maker = session_maker
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, _Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _load(self, key: StorageKey) -> _Record:
+        built = self.key_builder.build(key)
+        # Ещё не записанные в БД изменения этого процесса свежее того, что лежит в БД
+        record = self._pending.get(built)
+        if record is not None:
+            return record
+
+        async with self.session_maker() as session:
+            row = await session.get(FsmRecord, built)
+
+        # Пока ждали БД, запись могли изменить в этом же процессе
+        record = self._pending.get(built)
+        if record is not None:
+            return record
+        return _Record(key.destiny, row.state if row else None,
+                       json.loads(row.data) if row and row.data else {})
+
+    async def _store(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._pending[self.key_builder.build(key)] = _Record(key.destiny, state, data)
+        self._schedule_flush(self.flush_interval)
+
+    def _schedule_flush(self, delay: float) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        while True:
+            await asyncio.sleep(delay)
+            # Запись не прерываем, даже если задачу отменят при остановке бота
+            flushed = await asyncio.shield(self.flush())
+            # Пока шла запись, могли накопиться новые изменения
+            if not self._pending:
+                return
+            delay = self.flush_interval if flushed else max(self.flush_interval, 1.0)
+
+    async def flush(self) -> bool:
+        """Записывает накопленные изменения в БД: один upsert и один DELETE на пачку."""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return True
+
+            rows = [
+                {'key': key, 'destiny': record.destiny, 'state': record.state,
+                 'data': json.dumps(record.data, ensure_ascii=False)}
+                for key, record in pending.items() if record.state is not None or record.data
+            ]
+            # Пустые записи (состояние сброшено, данных нет) удаляем, чтобы таблица не росла
+            removed = [key for key, record in pending.items() if record.state is None and not record.data]
+
+            try:
+                async with self.session_maker() as session:
+                    if rows:
+                        statement = upsert(
+                            session.get_bind().dialect.name, FsmRecord.__table__, ['key'],
+                            lambda new: {'state': new.state, 'data': new.data, 'updated_at': func.now()}
+                        )
+                        await session.execute(statement, rows)
+                    if removed:
+                        await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(removed)))
+                    await session.commit()
+            except Exception:
+                logger.exception('Не удалось записать %s состояний FSM, повтор позже', len(pending))
+                # Возвращаем записи в очередь, если их не успели перезаписать новыми
+                for key, record in pending.items():
+                    self._pending.setdefault(key, record)
+                return False
+            return True
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._load(key)
+        await self._store(key, state.state if isinstance(state, State) else state, record.data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._load(key)
+        await self._store(key, record.state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(key)).data.copy()
+
+    async def purge(self, destiny: str, older_than: timedelta) -> int:
+        """Удаляет записи указанного назначения, которые не менялись дольше older_than."""
+        async with self.session_maker() as session:
+            # updated_at пишется часами БД — с ними и сравниваем, иначе при разных часовых поясах
+            # приложения и БД удалялись бы живые состояния или не удалялось бы ничего
+            now = await session.scalar(select(func.now()))
+            result = await session.execute(
+                delete(FsmRecord)
+                .where(FsmRecord.destiny == destiny)
+                .where(FsmRecord.updated_at < now - older_than)
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
@@ -0,0 +1,18 @@
+from typing import Callable, Dict, Sequence
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.sql import ColumnCollection
+
+
+# INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT DO UPDATE для используемых диалектов.
+# set_ получает колонки вставляемой строки (inserted/excluded) и возвращает обновляемые значения.
+def upsert(dialect_name: str, table: Table, index_elements: Sequence[str],
+           set_: Callable[[ColumnCollection], Dict]):
+    if dialect_name == 'mysql':
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update(set_(statement.inserted))
+    if dialect_name in ('sqlite', 'postgresql'):
+        statement = (sqlite.insert if dialect_name == 'sqlite' else postgresql.insert)(table)
+        return statement.on_conflict_do_update(index_elements=index_elements, set_=set_(statement.excluded))
+    raise NotImplementedError(f'Upsert is not supported for dialect {dialect_name}')
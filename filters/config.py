@@ -1,4 +1,7 @@
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
 
 IPHONE_CATEGORY_ID = 1
 IPAD_CATEGORY_ID = 2
@@ -8,15 +11,129 @@ MACBOOK_CATEGORY_ID = 5
 ADMIN_IDS = [1454714038, 2144211023]
 
 
+def _flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Профили движка БД: значения по умолчанию, каждое можно переопределить своей переменной окружения
+_DB_PROFILES = {
+    'production': {'echo': False, 'pool_size': 10, 'max_overflow': 20},
+    'development': {'echo': True, 'pool_size': 5, 'max_overflow': 5},
+}
+
+
 # Новые настройки (добавляем в тот же файл)
 class DbConfig:
     URL = os.getenv('SQLALCHEMY_URL')
+    PROFILE = os.getenv('DB_PROFILE', 'production')
+    _defaults = _DB_PROFILES.get(PROFILE, _DB_PROFILES['production'])
+    # echo пишет в лог каждый запрос с параметрами — только для отладки
+    ECHO = _flag('DB_ECHO', _defaults['echo'])
+    POOL_SIZE = int(os.getenv('DB_POOL_SIZE', _defaults['pool_size']))
+    MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', _defaults['max_overflow']))
+    POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    # MySQL закрывает простаивающие соединения (wait_timeout) — пересоздаём их раньше
+    POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    POOL_PRE_PING = _flag('DB_POOL_PRE_PING', True)
+    # Ограничение времени запроса на стороне БД в миллисекундах, 0 — без ограничения
+    STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+    # Запросы дольше порога (в секундах) пишутся в журнал медленных запросов
+    SLOW_QUERY_THRESHOLD = float(os.getenv('DB_SLOW_QUERY_THRESHOLD', 0.2))
+    # Больше запросов на один апдейт — предупреждение в лог (признак N+1 в обработчике)
+    QUERIES_PER_UPDATE_WARN = int(os.getenv('DB_QUERIES_PER_UPDATE_WARN', 20))
 
 
 class PricesConfig:
-    EXPORT_DIR = "/tmp/prices_export.csv"
+    # Выгрузка прайса держится в памяти, пока не превысит EXPORT_SPOOL_SIZE байт; строки читаются пачками
+    EXPORT_SPOOL_SIZE = int(os.getenv('PRICES_EXPORT_SPOOL_SIZE', 16 * 1024 * 1024))
+    EXPORT_BATCH_SIZE = int(os.getenv('PRICES_EXPORT_BATCH_SIZE', 1000))
+    # Сколько строк прайса за раз загружать во временную таблицу при импорте
+    IMPORT_CHUNK_SIZE = int(os.getenv('PRICES_IMPORT_CHUNK_SIZE', 1000))
+    # Потоки для чтения и записи файлов прайса, чтобы не блокировать цикл событий
+    FILE_WORKERS = int(os.getenv('PRICES_FILE_WORKERS', 2))
+
+
+class SelectionConfig:
+    # Сколько пользователей конфигуратора держать в памяти и сколько секунд хранить выбор без обращений
+    MAX_ENTRIES = int(os.getenv('SELECTION_MAX_ENTRIES', 10000))
+    TTL = int(os.getenv('SELECTION_TTL', 3600))
+
+
+class CatalogConfig:
+    # Как часто (в секундах) проверять версию каталога в БД и перезагружать срез, если её сменил другой экземпляр
+    POLL_INTERVAL = float(os.getenv('CATALOG_POLL_INTERVAL', 2))
+
+
+class NavigationConfig:
+    # Шаги каталога редактируют сообщение с нажатой кнопкой, а не присылают новое и удаляют старое:
+    # меньше запросов к Bot API на нажатие и реже упираемся в ограничения Telegram
+    EDIT_IN_PLACE = _flag('NAVIGATION_EDIT_IN_PLACE', True)
+
+
+class PhotosConfig:
+    # Чат, куда /warm_photos загружает картинки каталога; 0 — чат администратора, вызвавшего команду
+    SERVICE_CHAT_ID = int(os.getenv('PHOTOS_SERVICE_CHAT_ID', 0))
+    # Telegram ограничивает отправку в один чат примерно одним сообщением в секунду
+    WARMUP_RATE = float(os.getenv('PHOTOS_WARMUP_RATE', 1))
+
+
+class FsmConfig:
+    # memory — состояния в памяти процесса, sql — в таблице fsm_storage (общие для нескольких экземпляров бота)
+    STORAGE = os.getenv('FSM_STORAGE', 'memory')
+    FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', 0.05))
+
+
+class BotConfig:
+    # polling — long polling, webhook — aiohttp-сервер для вебхука (можно запускать несколько реплик)
+    MODE = os.getenv('BOT_MODE', 'polling')
+
+
+class WebhookConfig:
+    BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+    PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+    SECRET = os.getenv('WEBHOOK_SECRET')
+    HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+    # Сколько апдейтов процесс обрабатывает одновременно и сколько соединений держит Telegram
+    MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', 20))
+    MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+
+
+class BroadcastConfig:
+    # Telegram пропускает около 30 сообщений в секунду на бота — держим запас
+    RATE = float(os.getenv('BROADCAST_RATE', 25))
+    CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 10))
+    BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', 100))
+    MAX_ATTEMPTS = int(os.getenv('BROADCAST_MAX_ATTEMPTS', 5))
+
+
+class OutboxConfig:
+    # Как часто проверять outbox, если новых записей не было, и сколько сообщений слать одновременно
+    POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+    BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', 10))
+    MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+
+
+class MonitoringConfig:
+    # Как часто замерять задержку цикла событий и с какой задержки (в секундах) писать предупреждение
+    LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', 0.5))
+    LOOP_LAG_WARN_THRESHOLD = float(os.getenv('LOOP_LAG_WARN_THRESHOLD', 0.1))
+    # Метрики Prometheus (GET /metrics) слушают только локальный адрес; порт 0 — не запускать
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
 
 
 # Для удобства доступа
 db_config = DbConfig()
 prices_config = PricesConfig()
+selection_config = SelectionConfig()
+catalog_config = CatalogConfig()
+navigation_config = NavigationConfig()
+photos_config = PhotosConfig()
+fsm_config = FsmConfig()
+bot_config = BotConfig()
+webhook_config = WebhookConfig()
+broadcast_config = BroadcastConfig()
+outbox_config = OutboxConfig()
+monitoring_config = MonitoringConfig()
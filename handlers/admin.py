@@ -1,131 +1,224 @@
 # handlers/admin.py
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile
-from aiogram.filters import Command
-from sqlalchemy import text
-import csv
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+import asyncio
 import os
+import tempfile
+from datetime import datetime
 
-from filters.config import ADMIN_IDS, prices_config
+import aiofiles.os
+
+from filters.config import ADMIN_IDS, catalog_config, photos_config
+from database.catalog import bump_catalog_version, catalog_stats, load_catalog, refresh_items
 from database.models import async_session
+from database import requests as rq
+from database.broadcast import resume_broadcasts
+from database.photos import warm_up_photos
+from database.prices import import_prices, export_prices as export_price_list, last_export_time
+from monitoring.loop_lag import loop_lag
+from monitoring.sql import top_statements
+from utils.blocking import run_blocking
 
 router = Router()
 
 
+_EXPORT_USAGE = ("Использование: /export_prices [gzip] [since <дата|last>]\n"
+                 "Дата в формате 2026-10-18 или 2026-10-18 14:30, last — с прошлой выгрузки")
+
+
 @router.message(Command("export_prices"), F.from_user.id.in_(ADMIN_IDS))
-async def export_prices(message: Message) -> None:
-    """Экспорт цен с правильным разделением по колонкам"""
+async def export_prices(message: Message, command: CommandObject) -> None:
+    """Экспорт цен с правильным разделением по колонкам: /export_prices [gzip] [since <дата|last>]"""
+    words = (command.args or '').split()
+    args = [word for word in words if word.lower() not in ('gz', 'gzip')]
+    compress = len(args) != len(words)
+
+    since = None
+    if args:
+        if args[0].lower() != 'since' or len(args) < 2:
+            await message.answer(_EXPORT_USAGE)
+            return
+        if args[1].lower() == 'last':
+            since = await last_export_time()
+            if since is None:
+                await message.answer("Выгрузок ещё не было — выгружаю весь прайс")
+        else:
+            try:
+                since = datetime.fromisoformat(' '.join(args[1:]))
+            except ValueError:
+                await message.answer(_EXPORT_USAGE)
+                return
+
+    document, rows = await export_price_list(compress, since)
+    try:
+        if since is not None and not rows:
+            await message.answer(f"Цены не менялись с {since:%d.%m.%Y %H:%M:%S}")
+            return
+        await message.reply_document(
+            document=document,
+            caption="📊 Файл для редактирования цен\n"
+                    + (f"Изменения с {since:%d.%m.%Y %H:%M:%S}: {rows} товаров\n" if since is not None else "")
+                    + "Каждый параметр в своей колонке\n"
+                      "Редактируйте ТОЛЬКО колонку 'Цена'"
+                    + ("\nПеред загрузкой распакуйте архив" if compress else "")
+        )
+    finally:
+        document.close()
+
+
+@router.message(Command("reload_catalog"), F.from_user.id.in_(ADMIN_IDS))
+async def reload_catalog(message: Message) -> None:
+    """Перечитывает каталог из БД после ручной правки справочников — на всех экземплярах бота"""
     async with async_session() as session:
-        query = text("""
-        SELECT 
-            i.id,
-            c.name AS category,
-            m.name AS model,
-            cl.name AS color,
-            mem.size AS memory,
-            ss.size AS screen_size,
-            conn.type AS connectivity,
-            r.size AS ram,
-            i.price
-        FROM items i
-        LEFT JOIN categories c ON i.category_id = c.id
-        LEFT JOIN models m ON i.model_id = m.id
-        LEFT JOIN colors cl ON i.color_id = cl.id
-        LEFT JOIN memory mem ON i.memory_id = mem.id
-        LEFT JOIN screen_sizes ss ON i.screen_size_id = ss.id
-        LEFT JOIN connectivities conn ON i.connectivity_id = conn.id
-        LEFT JOIN RMA r ON i.ram_id = r.id
-        ORDER BY i.id
-        """)
-        result = await session.execute(query)
-        items = result.mappings().all()
-
-    # Создаем CSV с явным разделением колонок
-    os.makedirs(os.path.dirname(prices_config.EXPORT_DIR), exist_ok=True)
-
-    with open(prices_config.EXPORT_DIR, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.writer(f, delimiter=';')  # Используем точку с запятой как разделитель
-
-        # Заголовки колонок
-        headers = [
-            "ID", "Категория", "Модель", "Цвет",
-            "Память", "Экран", "Подключение",
-            "RAM", "Цена"
-        ]
-        writer.writerow(headers)
-
-        # Данные
-        for item in items:
-            row = [
-                item["id"],
-                item.get("category", ""),
-                item.get("model", ""),
-                item.get("color", ""),
-                item.get("memory", ""),
-                item.get("screen_size", ""),
-                item.get("connectivity", ""),
-                item.get("ram", ""),
-                item["price"]  # Цена всегда в последней колонке
-            ]
-            writer.writerow(row)
-
-    await message.reply_document(
-        document=FSInputFile(prices_config.EXPORT_DIR),
-        caption="📊 Файл для редактирования цен\n"
-                "Каждый параметр в своей колонке\n"
-                "Редактируйте ТОЛЬКО колонку 'Цена'"
+        await bump_catalog_version(session)
+        await session.commit()
+    snapshot = await load_catalog()
+    await message.answer(f"✅ Каталог перезагружен, версия {snapshot.version}\n"
+                         f"Остальные экземпляры бота обновятся в течение {catalog_config.POLL_INTERVAL:g} с")
+
+
+@router.message(Command("catalog_status"), F.from_user.id.in_(ADMIN_IDS))
+async def catalog_status(message: Message) -> None:
+    """Версия каталога в памяти этого экземпляра и время его перезагрузок"""
+    stats = catalog_stats()
+    await message.answer(
+        f"📦 Каталог: срез {stats['version']}, версия в БД {stats['source_version']}\n"
+        f"Полных загрузок: {stats['reloads']}, последняя {stats['last_reload_duration']:.2f} с, "
+        f"максимум {stats['max_reload_duration']:.2f} с\n"
+        f"Отставание от БД: последнее {stats['last_staleness']:.1f} с, максимум {stats['max_staleness']:.1f} с"
     )
 
 
-@router.message(F.document, F.from_user.id.in_(ADMIN_IDS))
-async def handle_price_file(message: Message):
-    if not message.document or not message.document.file_name.endswith('.csv'):
+@router.message(Command("loop_lag"), F.from_user.id.in_(ADMIN_IDS))
+async def show_loop_lag(message: Message) -> None:
+    """Задержка цикла событий: если она растёт, обработчики где-то блокируют бота"""
+    stats = loop_lag.stats()
+    await message.answer(
+        f"⏱ Задержка цикла событий\n"
+        f"Последняя: {stats['last'] * 1000:.1f} мс\n"
+        f"Средняя: {stats['avg'] * 1000:.1f} мс, p95: {stats['p95'] * 1000:.1f} мс\n"
+        f"Максимум за минуту: {stats['window_max'] * 1000:.1f} мс, за всё время: {stats['max'] * 1000:.1f} мс"
+    )
+
+
+# Сообщение Telegram ограничено 4096 символами — длинные запросы обрезаются
+_TOP_QUERY_LENGTH = 200
+
+
+@router.message(Command("top_queries"), F.from_user.id.in_(ADMIN_IDS))
+async def show_top_queries(message: Message, command: CommandObject) -> None:
+    """Самые затратные запросы к БД этого экземпляра по суммарному времени: /top_queries [количество]"""
+    limit = int(command.args) if command.args and command.args.isdigit() else 10
+    rows = top_statements(min(max(limit, 1), 15))
+    if not rows:
+        await message.answer("Запросов к БД ещё не было")
         return
+    lines = ["🐢 Запросы к БД по суммарному времени"]
+    for statement, count, total, longest in rows:
+        lines.append(f"\n{total * 1000:.0f} мс всего, {count} раз, максимум {longest * 1000:.1f} мс\n"
+                     f"{' '.join(statement.split())[:_TOP_QUERY_LENGTH]}")
+    await message.answer("\n".join(lines))
 
-    file_path = f"/tmp/updated_prices.csv"
-    await message.bot.download(message.document, destination=file_path)
 
-    updates = []
-    with open(file_path, 'r', encoding='utf-8-sig') as f:
-        reader = csv.reader(f, delimiter=';')  # Изменили на csv.reader
-        headers = next(reader)  # Читаем заголовки
+# Рассылки и загрузка картинок идут в фоне, чтобы не занимать обработчик на всё время отправки
+_background_tasks = set()
 
-        # Проверяем структуру файла
-        if 'Цена' not in headers or 'ID' not in headers:
-            await message.answer("❌ Файл должен содержать колонки 'ID' и 'Цена'")
-            os.remove(file_path)
-            return
 
-        price_col = headers.index('Цена')
-        id_col = headers.index('ID')
+async def _run_and_report(message: Message, run) -> None:
+    reports = await run
+    for report in reports:
+        await message.answer(
+            f"📨 Рассылка {report.broadcast_id} завершена\n"
+            f"Отправлено: {report.sent}, ошибок: {report.failed}, заблокировали бота: {report.blocked}\n"
+            f"{report.elapsed:.0f} с, {report.rate:.1f} сообщ./с"
+        )
 
-        for row in reader:
-            if len(row) <= max(price_col, id_col):
-                continue
 
-            try:
-                updates.append({
-                    "id": int(row[id_col]),
-                    "price": str(row[price_col]).strip()
-                })
-            except (ValueError, IndexError):
-                continue
-
-    if not updates:
+def _start_in_background(message: Message, run) -> None:
+    task = asyncio.create_task(_run_and_report(message, run))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@router.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast(message: Message, command: CommandObject) -> None:
+    """Рассылка текста всем пользователям: /broadcast <текст>"""
+    if not command.args:
+        await message.answer("Укажите текст: /broadcast <текст>")
+        return
+
+    async def run():
+        report = await rq.send_message_to_all_users(message.bot, command.args)
+        return [report] if report else []
+
+    _start_in_background(message, run())
+    await message.answer("🚀 Рассылка запущена")
+
+
+@router.message(Command("broadcast_resume"), F.from_user.id.in_(ADMIN_IDS))
+async def broadcast_resume(message: Message) -> None:
+    """Продолжает рассылки, прерванные остановкой бота"""
+    _start_in_background(message, resume_broadcasts(message.bot))
+    await message.answer("🔁 Незавершённые рассылки продолжены")
+
+
+async def _warm_photos_and_report(message: Message, chat_id: int) -> None:
+    report = await warm_up_photos(message.bot, chat_id, photos_config.WARMUP_RATE)
+    await message.answer(f"🖼 Загружено картинок: {report.uploaded}\n"
+                         f"Уже были загружены: {report.cached}, нет файла: {report.missing}, ошибок: {report.failed}")
+
+
+@router.message(Command("warm_photos"), F.from_user.id.in_(ADMIN_IDS))
+async def warm_photos(message: Message) -> None:
+    """Загружает картинки каталога в служебный чат, чтобы карточки товаров сразу отправлялись по file_id"""
+    chat_id = photos_config.SERVICE_CHAT_ID or message.chat.id
+    task = asyncio.create_task(_warm_photos_and_report(message, chat_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    await message.answer("🖼 Загрузка картинок каталога запущена")
+
+
+# Сколько ошибок импорта показывать в сообщении
+_REPORT_ERRORS = 20
+
+
+def _temp_csv_path() -> str:
+    fd, path = tempfile.mkstemp(prefix='prices_', suffix='.csv')
+    os.close(fd)
+    return path
+
+
+@router.message(F.document, F.from_user.id.in_(ADMIN_IDS))
+async def handle_price_file(message: Message):
+    if not message.document or not message.document.file_name.endswith('.csv'):
+        return
+
+    # Уникальное имя файла: два импорта одновременно не перезапишут друг друга
+    file_path = await run_blocking(_temp_csv_path)
+    try:
+        await message.bot.download(message.document, destination=file_path)
+        report = await import_prices(file_path)
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        return
+    except Exception as e:
+        await message.answer(f"❌ Ошибка базы данных: {str(e)}")
+        return
+    finally:
+        await aiofiles.os.remove(file_path)
+
+    if not report.rows:
         await message.answer("⚠ Не найдено данных для обновления")
-        os.remove(file_path)
         return
 
-    async with async_session() as session:
-        try:
-            await session.execute(
-                text("UPDATE items SET price = :price WHERE id = :id"),
-                updates
-            )
-            await session.commit()
-            await message.answer(f"✅ Обновлено цен: {len(updates)}")
-        except Exception as e:
-            await session.rollback()
-            await message.answer(f"❌ Ошибка базы данных: {str(e)}")
-        finally:
-            os.remove(file_path)
+    await refresh_items(report.changed_ids, report.catalog_version)
+
+    text_report = (f"✅ Обновлено цен: {report.updated}\n"
+                   f"Без изменений: {report.unchanged}")
+    if report.errors:
+        text_report += f"\n⚠ Не применено строк: {len(report.errors)}\n"
+        text_report += "\n".join(f"Строка {line}: {reason}" for line, reason in report.errors[:_REPORT_ERRORS])
+        if len(report.errors) > _REPORT_ERRORS:
+            text_report += f"\n… и ещё {len(report.errors) - _REPORT_ERRORS}"
+    await message.answer(text_report)
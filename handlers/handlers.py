@@ -6,11 +6,14 @@ from sqlalchemy import delete
 # from handlers.contact import router as manager_router
 # from handlers.help_handlers import router as helper
 from filters.config import (IPHONE_CATEGORY_ID, IPAD_CATEGORY_ID, WATCH_CATEGORY_ID, PODS_CATEGORY_ID,
-                            MACBOOK_CATEGORY_ID)
+                            MACBOOK_CATEGORY_ID, navigation_config)
 from dotenv import load_dotenv
 from keyboards import keyboards as kb
 from database import requests as rq
 from database.models import async_session
+from state.selection import BaseSelectionStore
+from utils.navigation import show_card, show_step
+from utils.prices import format_price
 
 
 load_dotenv()
@@ -44,49 +47,31 @@ async def catalog(message: Message):
     await message.answer('Выберите категорию товара', reply_markup=await kb.get_catalog())
 
 
+# Названия категорий для подписи к выбору модели
+DEVICE_TYPES = {
+    IPHONE_CATEGORY_ID: 'iPhone',
+    IPAD_CATEGORY_ID: 'iPad',
+    WATCH_CATEGORY_ID: 'Watch',
+    PODS_CATEGORY_ID: 'AirPods',
+    MACBOOK_CATEGORY_ID: 'MacBook',
+}
+
+
 @main_router.callback_query(F.data.startswith('category_'))
 async def category_selected(callback: CallbackQuery):
     category_id = int(callback.data.split('_')[1])
-    device_type = ''
-    if category_id == IPHONE_CATEGORY_ID:
-        device_type = 'iPhone'
-        models = await rq.get_models_by_category(IPHONE_CATEGORY_ID)
-        await callback.message.answer(f'Выберите модель из категории: {device_type}',
-                                      reply_markup=await kb.get_models_keyboard(models))
-    elif category_id == IPAD_CATEGORY_ID:
-        device_type = 'iPad'
-        models = await rq.get_models_by_category(IPAD_CATEGORY_ID)
-        await callback.message.answer(f'Выберите модель из категории: {device_type}',
-                                      reply_markup=await kb.get_models_keyboard(models))
-    elif category_id == WATCH_CATEGORY_ID:
-        device_type = 'Watch'
-        models = await rq.get_models_by_category(WATCH_CATEGORY_ID)
-        await callback.message.answer(f'Выберите модель из категории: {device_type}',
-                                      reply_markup=await kb.get_models_keyboard(models))
-    elif category_id == PODS_CATEGORY_ID:
-        device_type = 'AirPods'
-        models = await rq.get_models_by_category(PODS_CATEGORY_ID)
-        await callback.message.answer(f'Выберите модель из категории: {device_type}',
-                                      reply_markup=await kb.get_models_keyboard(models))
-    elif category_id == MACBOOK_CATEGORY_ID:
-        device_type = 'MacBook'
-        models = await rq.get_models_by_category(MACBOOK_CATEGORY_ID)
-        await callback.message.answer(f'Выберите модель из категории: {device_type}',
-                                      reply_markup=await kb.get_models_keyboard(models))
-    else:
-        await callback.message.answer('Нет подходящей модели')
-
-    await callback.message.delete()
-
-    if device_type:
-        await callback.answer(f'Вы выбрали категорию: {device_type}')
-
+    device_type = DEVICE_TYPES.get(category_id)
+    if device_type is None:
+        await show_step(callback, 'Нет подходящей модели')
+        return
 
-user_context = {}
+    await show_step(callback, f'Выберите модель из категории: {device_type}',
+                    reply_markup=await kb.get_models_keyboard(category_id))
+    await callback.answer(f'Вы выбрали категорию: {device_type}')
 
 
 @main_router.callback_query(F.data.startswith('model_'))
-async def model_selected(callback: CallbackQuery):
+async def model_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         model_id = int(callback.data.split('_')[1])
     except (ValueError, IndexError):
@@ -95,31 +80,25 @@ async def model_selected(callback: CallbackQuery):
 
     model = await rq.get_model(model_id)
     if not model:
-        await callback.message.answer('Извините, модель не найдена.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, модель не найдена.')
         return
 
     # Получение цветов для модели
     colors = await rq.get_models_colors(model_id)
     if not colors:
-        await callback.message.answer(f'Цвета для модели {model.name} не найдены.')
-        await callback.message.delete()
+        await show_step(callback, f'Цвета для модели {model.name} не найдены.')
         return
 
-    keyboard = await kb.get_colors_keyboard(colors, model.category_id)
-    await callback.message.answer(f'Выберите цвет для модели: {model.name}', reply_markup=keyboard)
-    await callback.message.delete()
+    keyboard = await kb.get_colors_keyboard(model_id)
+    await show_step(callback, f'Выберите цвет для модели: {model.name}', reply_markup=keyboard)
     await callback.answer(f'Вы выбрали {model.name}')
 
     # Сохранение выбранной модели и категории в контекст пользователя
-    if callback.from_user.id not in user_context:
-        user_context[callback.from_user.id] = {}
-    user_context[callback.from_user.id]['model_id'] = model_id
-    user_context[callback.from_user.id]['category_id'] = model.category_id
+    await selection_store.update(callback.from_user.id, model_id=model_id, category_id=model.category_id)
 
 
 @main_router.callback_query(F.data.startswith('color_'))
-async def color_selected(callback: CallbackQuery):
+async def color_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         color_id = int(callback.data.split('_')[1])
     except (ValueError, IndexError):
@@ -128,70 +107,62 @@ async def color_selected(callback: CallbackQuery):
 
     color = await rq.get_color(color_id)
     if not color:
-        await callback.message.answer('Извините, цвет не найден.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, цвет не найден.')
         return
 
     # Сохранение выбранного цвета в контекст пользователя
-    if callback.from_user.id not in user_context:
-        user_context[callback.from_user.id] = {}
-    user_context[callback.from_user.id]['color_id'] = color_id
+    await selection_store.update(callback.from_user.id, color_id=color_id)
 
     # Получение модели для выбранного цвета
     model = await rq.get_model_by_color(color_id)
     if not model:
-        await callback.message.answer('Извините, модель не найдена.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, модель не найдена.')
         return
 
     # Проверка, нужно ли открывать клавиатуру с выбором памяти или размера экрана
     if model.category_id == WATCH_CATEGORY_ID:
         screen_sizes = await rq.get_screen_sizes_by_model(model.id)
         if not screen_sizes:
-            await callback.message.answer(f'Размеры экрана для модели {model.name} не найдены.')
-            await callback.message.delete()
+            await show_step(callback, f'Размеры экрана для модели {model.name} не найдены.')
             return
 
-        screen_size_keyboard = await kb.get_screen_size_keyboard(screen_sizes)
-        await callback.message.answer(f'Выберите размер экрана для модели: {model.name}',
-                                      reply_markup=screen_size_keyboard)
+        screen_size_keyboard = await kb.get_screen_size_keyboard(model.id)
+        await show_step(callback, f'Выберите размер экрана для модели: {model.name}',
+                        reply_markup=screen_size_keyboard)
     elif model.category_id in [IPHONE_CATEGORY_ID, IPAD_CATEGORY_ID, MACBOOK_CATEGORY_ID]:
         memories = await rq.get_memories_by_model(model.id)
         if not memories:
-            await callback.message.answer(f'Память для модели {model.name} не найдена.')
-            await callback.message.delete()
+            await show_step(callback, f'Память для модели {model.name} не найдена.')
             return
 
-        memory_keyboard = await kb.get_memory_keyboard(memories)
-        await callback.message.answer(f'Выберите память для модели: {model.name}', reply_markup=memory_keyboard)
+        memory_keyboard = await kb.get_memory_keyboard(model.id)
+        await show_step(callback, f'Выберите память для модели: {model.name}', reply_markup=memory_keyboard)
     elif model.category_id == PODS_CATEGORY_ID:
         # Получение товара для выбранного цвета и модели
-        item = await rq.get_item_by_color_and_model(color.id, model.id)
-        if not item:
-            await callback.message.answer('Извините, товар временно не в наличии.')
-            await callback.message.delete()
+        variant = await rq.resolve_variant(color.id, model_id=model.id)
+        if not variant:
+            await show_step(callback, 'Извините, товар временно не в наличии.')
             return
+        item = variant.item
 
         # Формирование сообщения с информацией о товаре
         message_text = f'Ваш товар:\n\n' \
                        f'Категория: {item.name}\n' \
-                       f'Модель: {model.name}\n' \
-                       f'Цвет: {color.name}\n' \
-                       f'Цена: {item.price} руб.\n\n' \
+                       f'Модель: {variant.model.name}\n' \
+                       f'Цвет: {variant.color.name}\n' \
+                       f'Цена: {format_price(item.price)} руб.\n\n' \
                        f'Описание:\n{item.description}'
 
-        await callback.message.answer(message_text)
-
-        # Отправка клавиатуры с кнопкой добавления в корзину
-        add_to_basket_keyboard = await kb.get_add_to_basket_keyboard(item.id)
-        await callback.message.answer('Вы хотите добавить товар в корзину?', reply_markup=add_to_basket_keyboard)
+        # Карточка товара (с фото, если есть) вместе с кнопкой добавления в корзину — одним сообщением
+        await show_card(callback, item, message_text, await kb.get_add_to_basket_keyboard(item.id))
+    else:
+        await callback.message.delete()
 
-    await callback.message.delete()
     await callback.answer(f'Вы выбрали {color.name}')
 
 
 @main_router.callback_query(F.data.startswith('memory_'))
-async def memory_selected(callback: CallbackQuery):
+async def memory_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         memory_id = int(callback.data.split('_')[1])
     except (ValueError, IndexError):
@@ -200,125 +171,96 @@ async def memory_selected(callback: CallbackQuery):
 
     memory = await rq.get_memory(memory_id)
     if not memory:
-        await callback.message.answer('Извините, память не найдена.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, память не найдена.')
         return
 
-    # Проверка наличия ключа callback.from_user.id в словаре user_context
-    if callback.from_user.id not in user_context or 'color_id' not in user_context[callback.from_user.id]:
+    # Проверка, что пользователь уже выбрал цвет
+    selection = await selection_store.get(callback.from_user.id)
+    if selection is None or selection.color_id is None:
         await callback.message.answer('Пожалуйста, выберите цвет.')
         return
 
     # Получение цвета для выбранного товара и сохраненного цвета пользователя
-    color = await rq.get_color(user_context[callback.from_user.id]['color_id'])
+    color = await rq.get_color(selection.color_id)
     if not color:
-        await callback.message.answer('Извините, цвет не найден.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, цвет не найден.')
         return
 
     # Получение модели для выбранного цвета
     model = await rq.get_model_by_color(color.id)
     if not model:
-        await callback.message.answer('Извините, модель не найдена.')
-        await callback.message.delete()
+        await show_step(callback, 'Извините, модель не найдена.')
         return
 
     # Сохранение выбранной памяти в контекст пользователя
-    if callback.from_user.id not in user_context:
-        user_context[callback.from_user.id] = {}
-    user_context[callback.from_user.id]['memory_id'] = memory_id
+    await selection_store.update(callback.from_user.id, memory_id=memory_id)
 
     # Проверка, нужно ли открывать клавиатуру с выбором оперативной памяти
     if model.category_id == MACBOOK_CATEGORY_ID:
         rams = await rq.get_rams_by_model(model.id)
         if not rams:
-            await callback.message.answer(f'Оперативная память для модели {model.name} не найдена.')
-            await callback.message.delete()
+            await show_step(callback, f'Оперативная память для модели {model.name} не найдена.')
             return
 
-        ram_keyboard = await kb.get_ram_keyboard(rams)
-        await callback.message.delete()
-        await callback.message.answer(f'Выберите оперативную память для модели: {model.name}',
-                                      reply_markup=ram_keyboard)
-        await callback.answer(f'Вы выбрали {memory.size}')
+        ram_keyboard = await kb.get_ram_keyboard(model.id)
+        await show_step(callback, f'Выберите оперативную память для модели: {model.name}',
+                        reply_markup=ram_keyboard)
     elif model.category_id == IPAD_CATEGORY_ID:
         # Получение типов подключения для выбранной модели
         connectivities = await rq.get_connectivities_by_model(model.id)
         if not connectivities:
-            await callback.message.answer(f'Типы подключения для модели {model.name} не найдены.')
-            await callback.message.delete()
+            await show_step(callback, f'Типы подключения для модели {model.name} не найдены.')
             return
 
         # Отправка клавиатуры с выбором типа подключения
-        connection_keyboard = await kb.get_connection_keyboard(connectivities)
-        await callback.message.delete()
-        await callback.message.answer(f'Выберите тип подключения для модели: {model.name}',
-                                      reply_markup=connection_keyboard)
-        await callback.answer(f'Вы выбрали {memory.size}')
+        connection_keyboard = await kb.get_connection_keyboard(model.id)
+        await show_step(callback, f'Выберите тип подключения для модели: {model.name}',
+                        reply_markup=connection_keyboard)
     else:
         # Получение товара для выбранной памяти, цвета и модели
-        item = await rq.get_item_by_memory_color_and_model(memory.id, color.id, model.id)
-        if not item:
-            await callback.message.answer('Извините, товар временно не в наличии.')
-            await callback.message.delete()
+        variant = await rq.resolve_variant(color.id, model_id=model.id, memory_id=memory.id)
+        if not variant:
+            await show_step(callback, 'Извините, товар временно не в наличии.')
             return
+        item = variant.item
 
         # Формирование сообщения с информацией о товаре
         message_text = f'Ваш товар:\n\n' \
                        f'Категория: {item.name}\n' \
-                       f'Модель: {model.name}\n' \
-                       f'Цвет: {color.name}\n' \
-                       f'Память: {memory.size}\n' \
-                       f'Цена: {item.price} руб.\n\n' \
+                       f'Модель: {variant.model.name}\n' \
+                       f'Цвет: {variant.color.name}\n' \
+                       f'Память: {variant.memory.size}\n' \
+                       f'Цена: {format_price(item.price)} руб.\n\n' \
                        f'Описание:\n{item.description}'
 
-        await callback.message.answer(message_text)
+        # Карточка товара (с фото, если есть) вместе с кнопкой добавления в корзину — одним сообщением
+        await show_card(callback, item, message_text, await kb.get_add_to_basket_keyboard(item.id))
 
-        # Отправка клавиатуры с кнопкой добавления в корзину
-        add_to_basket_keyboard = await kb.get_add_to_basket_keyboard(item.id)
-        await callback.message.answer('Вы хотите добавить товар в корзину?', reply_markup=add_to_basket_keyboard)
-
-    await callback.message.delete()
     await callback.answer(f'Вы выбрали {memory.size}')
 
 
 @main_router.callback_query(F.data.startswith('ram_'))
-async def ram_selected(callback: CallbackQuery):
+async def ram_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         ram_id = int(callback.data.split('_')[1])
     except (ValueError, IndexError):
         await callback.message.answer("Некорректные данные запроса. Пожалуйста, попробуйте снова.")
         return
 
-    # Проверка наличия ключей 'color_id', 'memory_id' и 'model_id' в словаре user_context
-    if (callback.from_user.id not in user_context or 'color_id' not in user_context[callback.from_user.id]
-            or 'memory_id' not in user_context[callback.from_user.id]
-            or 'model_id' not in user_context[callback.from_user.id]):
+    # Проверка, что пользователь уже выбрал модель, цвет и память
+    selection = await selection_store.get(callback.from_user.id)
+    if (selection is None or selection.color_id is None or selection.memory_id is None
+            or selection.model_id is None):
         await callback.message.answer('Пожалуйста, выберите модель, цвет и память.')
         return
 
-    # Получение модели, цвета и памяти для выбранного товара и сохраненных значений пользователя
-    model = await rq.get_model(user_context[callback.from_user.id]['model_id'])
-    color = await rq.get_color(user_context[callback.from_user.id]['color_id'])
-    memory = await rq.get_memory(user_context[callback.from_user.id]['memory_id'])
-    if not model or not color or not memory:
-        await callback.message.answer('Извините, модель, цвет или память не найдены.')
-        await callback.message.delete()
-        return
-
-    # Получение выбранной оперативной памяти
-    ram = await rq.get_ram(ram_id)
-    if not ram:
-        await callback.message.answer('Извините, оперативная память не найдена.')
-        await callback.message.delete()
-        return
-
-    # Получение товара для выбранной модели, цвета, памяти и оперативной памяти
-    item = await rq.get_item_by_model_memory_color_and_ram(model.id, memory.id, color.id, ram.id)
-    if not item:
-        await callback.message.answer('Извините, товар временно не в наличии.')
-        await callback.message.delete()
+    # Получение товара вместе с моделью, цветом, памятью и оперативной памятью одним запросом
+    variant = await rq.resolve_variant(selection.color_id, model_id=selection.model_id,
+                                       memory_id=selection.memory_id, ram_id=ram_id)
+    if not variant:
+        await show_step(callback, 'Извините, товар временно не в наличии.')
         return
+    item, model, color, memory, ram = variant.item, variant.model, variant.color, variant.memory, variant.ram
 
     # Формирование сообщения с информацией о товаре
     message_text = f'Ваш товар:\n\n' \
@@ -327,43 +269,37 @@ async def ram_selected(callback: CallbackQuery):
                    f'Цвет: {color.name}\n' \
                    f'Память: {memory.size}\n' \
                    f'Оперативная память: {ram.size}\n' \
-                   f'Цена: {item.price} руб.\n\n' \
+                   f'Цена: {format_price(item.price)} руб.\n\n' \
                    f'Описание:\n{item.description}'
 
-    await callback.message.answer(message_text)
-
-    # Отправка клавиатуры с кнопкой добавления в корзину
-    add_to_basket_keyboard = await kb.get_add_to_basket_keyboard(item.id)
-    await callback.message.answer('Вы хотите добавить товар в корзину?', reply_markup=add_to_basket_keyboard)
-
-    await callback.message.delete()
+    # Карточка товара (с фото, если есть) вместе с кнопкой добавления в корзину — одним сообщением
+    await show_card(callback, item, message_text, await kb.get_add_to_basket_keyboard(item.id))
     await callback.answer(f'Вы выбрали {ram.size}')
 
 
 @main_router.callback_query(F.data.startswith('connection_'))
-async def connection_selected(callback: CallbackQuery):
+async def connection_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         connectivity_id = int(callback.data.split('_')[1])
     except (ValueError, IndexError):
         await callback.message.answer("Некорректные данные запроса. Пожалуйста, попробуйте снова.")
         return
 
-    # Получение модели, цвета, памяти и типа подключения для выбранного товара и сохраненных значений пользователя
-    model = await rq.get_model(user_context[callback.from_user.id]['model_id'])
-    color = await rq.get_color(user_context[callback.from_user.id]['color_id'])
-    memory = await rq.get_memory(user_context[callback.from_user.id]['memory_id'])
-    connectivity = await rq.get_connectivity(connectivity_id)
-    if not model or not color or not memory or not connectivity:
-        await callback.message.answer('Извините, модель, цвет, память или тип подключения не найдены.')
-        await callback.message.delete()
+    # Проверка, что пользователь уже выбрал модель, цвет и память
+    selection = await selection_store.get(callback.from_user.id)
+    if (selection is None or selection.color_id is None or selection.memory_id is None
+            or selection.model_id is None):
+        await callback.message.answer('Пожалуйста, выберите модель, цвет и память.')
         return
 
-    # Получение товара для выбранной модели, цвета, памяти и типа подключения
-    item = await rq.get_item_by_memory_color_model_and_connectivity(memory.id, color.id, model.id, connectivity.id)
-    if not item:
-        await callback.message.answer('Извините, товар временно не в наличии.')
-        await callback.message.delete()
+    # Получение товара вместе с моделью, цветом, памятью и типом подключения одним запросом
+    variant = await rq.resolve_variant(selection.color_id, model_id=selection.model_id,
+                                       memory_id=selection.memory_id, connectivity_id=connectivity_id)
+    if not variant:
+        await show_step(callback, 'Извините, товар временно не в наличии.')
         return
+    item, model, color, memory, connectivity = (variant.item, variant.model, variant.color, variant.memory,
+                                                variant.connectivity)
 
     # Формирование сообщения с информацией о товаре
     message_text = f'Ваш товар:\n\n' \
@@ -372,63 +308,37 @@ async def connection_selected(callback: CallbackQuery):
                    f'Цвет: {color.name}\n' \
                    f'Память: {memory.size}\n' \
                    f'Тип подключения: {connectivity.type}\n' \
-                   f'Цена: {item.price} руб.\n\n' \
+                   f'Цена: {format_price(item.price)} руб.\n\n' \
                    f'Описание:\n{item.description}'
 
-    await callback.message.answer(message_text)
-
-    # Отправка клавиатуры с кнопкой добавления в корзину
-    add_to_basket_keyboard = await kb.get_add_to_basket_keyboard(item.id)
-    await callback.message.answer('Вы хотите добавить товар в корзину?', reply_markup=add_to_basket_keyboard)
-
-    await callback.message.delete()
+    # Карточка товара (с фото, если есть) вместе с кнопкой добавления в корзину — одним сообщением
+    await show_card(callback, item, message_text, await kb.get_add_to_basket_keyboard(item.id))
     await callback.answer(f'Вы выбрали {connectivity.type}')
 
 
 @main_router.callback_query(F.data.startswith('screen_size_'))
-async def screen_size_selected(callback: CallbackQuery):
+async def screen_size_selected(callback: CallbackQuery, selection_store: BaseSelectionStore):
     try:
         screen_size_id = int(callback.data.split('_')[2])
     except (ValueError, IndexError):
         await callback.message.answer("Некорректные данные запроса. Пожалуйста, попробуйте снова.")
         return
 
-    screen_size = await rq.get_screen_size(screen_size_id)
-    if not screen_size:
-        await callback.message.answer('Извините, размер экрана не найден.')
-        await callback.message.delete()
-        return
-
-    # Проверка наличия ключа callback.from_user.id в словаре user_context
-    if callback.from_user.id not in user_context or 'color_id' not in user_context[callback.from_user.id]:
+    # Проверка, что пользователь уже выбрал цвет
+    selection = await selection_store.get(callback.from_user.id)
+    if selection is None or selection.color_id is None:
         await callback.message.answer('Пожалуйста, выберите цвет.')
         return
 
-    # Получение цвета для выбранного товара и сохраненного цвета пользователя
-    color = await rq.get_color(user_context[callback.from_user.id]['color_id'])
-    if not color:
-        await callback.message.answer('Извините, цвет не найден.')
-        await callback.message.delete()
-        return
-
-    # Получение модели для выбранного цвета
-    model = await rq.get_model_by_color(color.id)
-    if not model:
-        await callback.message.answer('Извините, модель не найдена.')
-        await callback.message.delete()
-        return
-
     # Сохранение выбранного размера экрана в контекст пользователя
-    if callback.from_user.id not in user_context:
-        user_context[callback.from_user.id] = {}
-    user_context[callback.from_user.id]['screen_size_id'] = screen_size_id
-
-    # Получение товара для выбранного размера экрана, цвета и модели
-    item = await rq.get_item_by_screen_size_color_and_model(screen_size.id, color.id, model.id)
-    if not item:
-        await callback.message.answer('Извините, товар временно не в наличии.')
-        await callback.message.delete()
+    selection = await selection_store.update(callback.from_user.id, screen_size_id=screen_size_id)
+
+    # Получение товара вместе с моделью, цветом и размером экрана одним запросом
+    variant = await rq.resolve_variant(selection.color_id, screen_size_id=screen_size_id)
+    if not variant:
+        await show_step(callback, 'Извините, товар временно не в наличии.')
         return
+    item, model, color, screen_size = variant.item, variant.model, variant.color, variant.screen_size
 
     # Формирование сообщения с информацией о товаре
     message_text = f'Ваш товар:\n\n' \
@@ -436,24 +346,18 @@ async def screen_size_selected(callback: CallbackQuery):
                    f'Модель: {model.name}\n' \
                    f'Цвет: {color.name}\n' \
                    f'Размер экрана: {screen_size.size}\n' \
-                   f'Цена: {item.price} руб.\n\n' \
+                   f'Цена: {format_price(item.price)} руб.\n\n' \
                    f'Описание:\n{item.description}'
 
-    await callback.message.answer(message_text)
-
-    # Отправка клавиатуры с кнопкой добавления в корзину
-    add_to_basket_keyboard = await kb.get_add_to_basket_keyboard(item.id)
-    await callback.message.answer('Вы хотите добавить товар в корзину?', reply_markup=add_to_basket_keyboard)
-
-    await callback.message.delete()
+    # Карточка товара (с фото, если есть) вместе с кнопкой добавления в корзину — одним сообщением
+    await show_card(callback, item, message_text, await kb.get_add_to_basket_keyboard(item.id))
     await callback.answer(f'Вы выбрали {screen_size.size}')
 
 
 # Обработка кнопки назад для возврата к категориям
 @main_router.callback_query(F.data.startswith('back_to_categories'))
 async def back_to_categories(callback: CallbackQuery):
-    await callback.message.answer('Выберите категорию:', reply_markup=await kb.get_catalog())
-    await callback.message.delete()
+    await show_step(callback, 'Выберите категорию:', reply_markup=await kb.get_catalog())
     await callback.answer('Вы вернулись к выбору категории')
 
 
@@ -461,9 +365,7 @@ async def back_to_categories(callback: CallbackQuery):
 @main_router.callback_query(F.data.startswith('back_to_models'))
 async def back_to_models(callback: CallbackQuery):
     category_id = int(callback.data.split('_')[3])
-    models = await rq.get_models_by_category(category_id)
-    await callback.message.answer('Выберете модель:', reply_markup=await kb.get_models_keyboard(models))
-    await callback.message.delete()
+    await show_step(callback, 'Выберете модель:', reply_markup=await kb.get_models_keyboard(category_id))
     await callback.answer('Вы вернулись к выбору модели')
 
 
@@ -473,19 +375,17 @@ ALLOWED_CATEGORIES = {IPHONE_CATEGORY_ID, IPAD_CATEGORY_ID, MACBOOK_CATEGORY_ID,
 
 
 @main_router.callback_query(F.data == 'back_to_colors')
-async def back_to_colors(callback: CallbackQuery):
+async def back_to_colors(callback: CallbackQuery, selection_store: BaseSelectionStore):
     # Получение model_id и category_id из контекста пользователя
-    user_data = user_context.get(callback.from_user.id)
-    if user_data:
-        model_id = user_data['model_id']
-        category_id = user_data['category_id']
+    selection = await selection_store.get(callback.from_user.id)
+    if selection and selection.model_id is not None:
+        model_id = selection.model_id
+        category_id = selection.category_id
 
         # Проверка, можно ли вернуться к выбору цвета для текущей категории
         if category_id in ALLOWED_CATEGORIES:
-            colors = await rq.get_models_colors(model_id)
-            keyboard = await kb.get_colors_keyboard(colors, category_id)
-            await callback.message.answer('Выберите цвет:', reply_markup=keyboard)
-            await callback.message.delete()
+            keyboard = await kb.get_colors_keyboard(model_id)
+            await show_step(callback, 'Выберите цвет:', reply_markup=keyboard)
             await callback.answer('Вы вернулись к выбору цвета')
         else:
             await callback.message.answer('Возврат к выбору цвета недоступен для этой категории.')
@@ -494,19 +394,18 @@ async def back_to_colors(callback: CallbackQuery):
 
 
 @main_router.callback_query(F.data == 'back_to_memory')
-async def back_to_memory(callback: CallbackQuery):
+async def back_to_memory(callback: CallbackQuery, selection_store: BaseSelectionStore):
     # Получение модели для выбранного цвета
-    color = await rq.get_color(user_context[callback.from_user.id]['color_id'])
-    model = await rq.get_model_by_color(color.id)
-
-    # Получение памяти для выбранной модели
-    memories = await rq.get_memories_by_model(model.id)
+    selection = await selection_store.get(callback.from_user.id)
+    model = await rq.get_model_by_color(selection.color_id) if selection and selection.color_id else None
+    if not model:
+        await callback.message.answer('Не удалось вернуться к выбору памяти. Пожалуйста, начните сначала.')
+        return
 
-    # Создание клавиатуры с выбором памяти
-    memory_keyboard = await kb.get_memory_keyboard(memories)
+    # Создание клавиатуры с выбором памяти для выбранной модели
+    memory_keyboard = await kb.get_memory_keyboard(model.id)
 
-    # Отправка сообщения с клавиатурой и удаление предыдущего сообщения
-    await callback.message.edit_text(f'Выберите память для модели: {model.name}', reply_markup=memory_keyboard)
+    await show_step(callback, f'Выберите память для модели: {model.name}', reply_markup=memory_keyboard)
     await callback.answer('Вы вернулись к выбору памяти')
 
 
@@ -521,11 +420,13 @@ async def add_to_basket(callback: CallbackQuery):
     user_id = callback.from_user.id
     success = await rq.add_item_to_basket(user_id, item_id)
 
-    if success:
-        await callback.message.answer("Товар успешно добавлен в корзину.")
-    else:
-        await callback.message.answer("Извините, товар не найден.")
+    text = "Товар успешно добавлен в корзину." if success else "Извините, товар не найден."
+    if navigation_config.EDIT_IN_PLACE:
+        # Карточка остаётся на месте, результат показывается всплывающим уведомлением
+        await callback.answer(text)
+        return
 
+    await callback.message.answer(text)
     await callback.answer()
 
 
@@ -539,9 +440,7 @@ async def show_basket(message: Message):
         return
 
     basket_text = "Ваша корзина:\n\n"
-    total_price = 0
-    for basket_item, item, model, color, screen_size, memory, connectivity, ram in basket_items:
-        item_total_price = float(item.price) * basket_item.quantity
+    for basket_item, item, model, color, screen_size, memory, connectivity, ram, subtotal, total in basket_items:
         basket_text += f"{model.name} ({basket_item.quantity} шт.)\n" \
                        f"Цвет: {color.name}\n"
 
@@ -557,11 +456,10 @@ async def show_basket(message: Message):
         if model.category_id == MACBOOK_CATEGORY_ID:
             basket_text += f"Оперативная память: {ram.size}\n"
 
-        basket_text += f"Цена: {item.price} руб.\n" \
-                       f"Сумма: {item_total_price} руб.\n\n"
-        total_price += item_total_price
+        basket_text += f"Цена: {format_price(item.price)} руб.\n" \
+                       f"Сумма: {format_price(subtotal)} руб.\n\n"
 
-    basket_text += f"Общая стоимость: {total_price} руб."
+    basket_text += f"Общая стоимость: {format_price(total)} руб."
     await message.answer(basket_text, reply_markup=kb.get_basket_keyboard())
 
 
@@ -3,19 +3,44 @@ from aiogram.types import Message, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from keyboards import keyboards as kb
 from database import requests as rq
-from aiogram import Bot
 
 import re
 
 from keyboards.keyboards import get_number, main_keyboard
-from database.models import async_session, Order
-from database.requests import notify_admins
 from filters.config import (IPAD_CATEGORY_ID, MACBOOK_CATEGORY_ID)
 from state.register import OrderState
+from utils.prices import format_price
 
 order_router = Router()
 
 
+def format_order_items(order_items) -> str:
+    """Текст строк заказа (rq.checkout) для подтверждения покупателю и уведомления администраторам."""
+    items_text = ""
+    total = 0
+    for order_item, item, model, color, screen_size, memory, connectivity, ram, subtotal, total in order_items:
+        items_text += f"{model.name} ({order_item.quantity} шт.)\n" \
+                      f"Цвет: {color.name}\n"
+
+        if screen_size:
+            items_text += f"Размер экрана: {screen_size.size}\n"
+
+        if memory:
+            items_text += f"Память: {memory.size}\n"
+
+        if model.category_id == IPAD_CATEGORY_ID:
+            items_text += f"Тип соединения: {connectivity.type}\n"
+
+        if model.category_id == MACBOOK_CATEGORY_ID:
+            items_text += f"Оперативная память: {ram.size}\n"
+
+        items_text += f"Цена: {format_price(order_item.price)} руб.\n" \
+                      f"Сумма: {format_price(subtotal)} руб.\n\n"
+
+    items_text += f"Общая стоимость: {format_price(total)} руб.\n\n"
+    return items_text
+
+
 @order_router.message(F.text == 'Оформить заказ')
 async def order_delivery(message: Message, state: FSMContext):
     user_id = message.from_user.id
@@ -81,16 +106,25 @@ async def process_email(message: Message, state: FSMContext):
 
 
 @order_router.message(OrderState.waiting_for_delivery_datetime)
-async def process_delivery_datetime(message: Message, state: FSMContext, bot: Bot):
+async def process_delivery_datetime(message: Message, state: FSMContext):
     delivery_datetime = message.text
     await state.update_data(delivery_datetime=delivery_datetime)
     user_data = await state.get_data()
-    await save_order_to_db(message.from_user.id, user_data)
 
-    # Получаем товары из корзины пользователя
-    basket_items = await rq.get_basket_items(message.from_user.id)
+    # Заказ со строками, уведомления администраторам и очистка корзины — одной транзакцией;
+    # подтверждение строится из тех же строк, что записаны в заказ
+    result = await rq.checkout(message.from_user.id, user_data, format_order_items)
+    if result.status == 'changed':
+        # Данные формы сохраняются: повторная отправка даты оформит заказ по текущей корзине
+        await message.answer('Корзина изменилась во время оформления заказа. '
+                             'Пожалуйста, введите желаемую дату и время доставки ещё раз:')
+        return
+    await state.clear()
+    if result.status == 'empty':
+        await message.answer('Добавьте товар, чтобы оформить заказ', reply_markup=main_keyboard)
+        return
 
-    # Формируем сообщение с данными пользователя и товарами из корзины
+    # Формируем сообщение с данными пользователя и товарами заказа
     response_message = (
         f'Ваш заказ принят!✅\n'
         f'👤ФИО: {user_data["name"]}\n'
@@ -100,59 +134,10 @@ async def process_delivery_datetime(message: Message, state: FSMContext, bot: Bo
         f'🚀Желаемая дата и время доставки: {user_data["delivery_datetime"]}\n\n'
         f'Товары в заказе:\n'
     )
-
-    total_price = 0
-    items_text = ""
-    for basket_item, item, model, color, screen_size, memory, connectivity, ram in basket_items:
-        item_total_price = float(item.price) * basket_item.quantity
-        items_text += f"{model.name} ({basket_item.quantity} шт.)\n" \
-                      f"Цвет: {color.name}\n"
-
-        if screen_size:
-            items_text += f"Размер экрана: {screen_size.size}\n"
-
-        if memory:
-            items_text += f"Память: {memory.size}\n"
-
-        if model.category_id == IPAD_CATEGORY_ID:
-            items_text += f"Тип соединения: {connectivity.type}\n"
-
-        if model.category_id == MACBOOK_CATEGORY_ID:
-            items_text += f"Оперативная память: {ram.size}\n"
-
-        items_text += f"Цена: {item.price} руб.\n" \
-                      f"Сумма: {item_total_price} руб.\n\n"
-        total_price += item_total_price
-
-    items_text += f"Общая стоимость: {total_price} руб.\n\n"
-    response_message += items_text
+    response_message += format_order_items(result.items)
     response_message += f'Благодарим Вас за оформление заказа! В ближайшее время наш менеджер выйдет с Вами на связь'
 
-    # Добавляем информацию о товарах в user_data
-    user_data["items"] = items_text
-
-    # Очистка корзины пользователя
-    await rq.clear_basket(message.from_user.id)
-
     await message.answer(response_message, reply_markup=main_keyboard)
-    await state.clear()
-
-    # Отправка уведомлений администраторам
-    await notify_admins(bot, user_data)
-
-
-async def save_order_to_db(user_id: int, data: dict):
-    async with async_session() as session:
-        order = Order(
-            user_id=user_id,
-            name=data['name'],
-            address=data['address'],
-            phone=data['phone'],
-            email=data['email'],
-            delivery_datetime=data['delivery_datetime']
-        )
-        session.add(order)
-        await session.commit()
 
 
 async def cancel_order(message: Message, state: FSMContext):
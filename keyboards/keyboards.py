@@ -4,10 +4,9 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from typing import List
-from database.models import Model, Color, Memory, ScreenSize, Connectivity
+from typing import Callable, Dict, Optional, Tuple
 
-from database import requests as rq
+from database.catalog import CatalogSnapshot, get_catalog as get_catalog_snapshot
 
 
 main_keyboard = ReplyKeyboardMarkup(
@@ -52,12 +51,34 @@ get_number = ReplyKeyboardMarkup(
 )
 
 
-# Получение каталога из БД
-async def get_catalog():
-    all_categories = await rq.get_categories()
+# Готовые инлайн-клавиатуры каталога: (вид, id, версия каталога) -> разметка.
+# Разметка aiogram неизменяема, поэтому один экземпляр можно отдавать всем пользователям.
+_markup_cache: Dict[Tuple[str, Optional[int], int], InlineKeyboardMarkup] = {}
+_markup_cache_version = 0
+
+
+async def _cached_markup(kind: str, key_id: Optional[int],
+                         build: Callable[[CatalogSnapshot, Optional[int]], InlineKeyboardMarkup]
+                         ) -> InlineKeyboardMarkup:
+    global _markup_cache_version
+
+    catalog = await get_catalog_snapshot()
+    if catalog.version != _markup_cache_version:
+        # Каталог сменился — клавиатуры прежней версии больше не понадобятся
+        _markup_cache.clear()
+        _markup_cache_version = catalog.version
+
+    cache_key = (kind, key_id, catalog.version)
+    markup = _markup_cache.get(cache_key)
+    if markup is None:
+        markup = _markup_cache[cache_key] = build(catalog, key_id)
+    return markup
+
+
+def _build_catalog(catalog: CatalogSnapshot, _: Optional[int]) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
-    for category in all_categories:
+    for category in catalog.categories:
         builder.add(
             InlineKeyboardButton(
                 text=category.name,
@@ -67,51 +88,43 @@ async def get_catalog():
     return builder.adjust(2).as_markup()
 
 
-# Кнопка моделей из БД
-async def get_models_keyboard(models: List[Model]) -> InlineKeyboardMarkup:
+def _build_models_keyboard(catalog: CatalogSnapshot, category_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for model in models:
+    for model in catalog.models_by_category.get(category_id, ()):
         builder.add(InlineKeyboardButton(text=model.name, callback_data=f'model_{model.id}'))
     builder.add(InlineKeyboardButton(text='🔙Назад', callback_data='back_to_categories'))
     return builder.adjust(1).as_markup()
 
 
-# Кнопка цвета
-async def get_colors_keyboard(colors: List[Color], category_id: int) -> InlineKeyboardMarkup:
+def _build_colors_keyboard(catalog: CatalogSnapshot, model_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for color in colors:
+    for color in catalog.colors_by_model.get(model_id, ()):
         builder.add(InlineKeyboardButton(text=color.name, callback_data=f'color_{color.id}'))
+    model = catalog.models.get(model_id)
+    category_id = model.category_id if model else None
     builder.add(InlineKeyboardButton(text='🔙Назад', callback_data=f'back_to_models_{category_id}'))
     return builder.adjust(1).as_markup()
 
 
-async def get_memory_keyboard(memories: List[Memory]) -> InlineKeyboardMarkup:
+def _build_memory_keyboard(catalog: CatalogSnapshot, model_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for memory in memories:
+    for memory in catalog.memories_by_model.get(model_id, ()):
         builder.add(InlineKeyboardButton(text=memory.size, callback_data=f'memory_{memory.id}'))
     builder.add(InlineKeyboardButton(text='🔙Назад', callback_data='back_to_colors'))
     return builder.adjust(1).as_markup()
 
 
-async def get_screen_size_keyboard(screen_sizes: List[ScreenSize]) -> InlineKeyboardMarkup:
+def _build_screen_size_keyboard(catalog: CatalogSnapshot, model_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for screen_size in screen_sizes:
+    for screen_size in catalog.screen_sizes_by_model.get(model_id, ()):
         builder.add(InlineKeyboardButton(text=screen_size.size, callback_data=f'screen_size_{screen_size.id}'))
     builder.add(InlineKeyboardButton(text='🔙Назад', callback_data='back_to_colors'))
     return builder.adjust(1).as_markup()
 
 
-def get_cancel_keyboard():
-    keyboard = [
-        [KeyboardButton(text="Отмена")]
-    ]
-    reply_markup = ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
-    return reply_markup
-
-
-async def get_ram_keyboard(rams):
+def _build_ram_keyboard(catalog: CatalogSnapshot, model_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for ram in rams:
+    for ram in catalog.rams_by_model.get(model_id, ()):
         button_text = f"{ram.size}"
         callback_data = f"ram_{ram.id}"
         builder.row(InlineKeyboardButton(text=button_text, callback_data=callback_data))
@@ -119,9 +132,9 @@ async def get_ram_keyboard(rams):
     return builder.as_markup()
 
 
-async def get_connection_keyboard(connectivities: List[Connectivity]):
+def _build_connection_keyboard(catalog: CatalogSnapshot, model_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for connectivity in connectivities:
+    for connectivity in catalog.connectivities_by_model.get(model_id, ()):
         button_text = f"{connectivity.type}"
         callback_data = f"connection_{connectivity.id}"
         builder.row(InlineKeyboardButton(text=button_text, callback_data=callback_data))
@@ -129,12 +142,55 @@ async def get_connection_keyboard(connectivities: List[Connectivity]):
     return builder.as_markup()
 
 
-async def get_add_to_basket_keyboard(item_id: int):
+def _build_add_to_basket_keyboard(_: CatalogSnapshot, item_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="Добавить в корзину", callback_data=f'add_to_basket_{item_id}'))
     return builder.as_markup()
 
 
+# Получение каталога из БД
+async def get_catalog() -> InlineKeyboardMarkup:
+    return await _cached_markup('catalog', None, _build_catalog)
+
+
+# Кнопка моделей из БД
+async def get_models_keyboard(category_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('models', category_id, _build_models_keyboard)
+
+
+# Кнопка цвета
+async def get_colors_keyboard(model_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('colors', model_id, _build_colors_keyboard)
+
+
+async def get_memory_keyboard(model_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('memory', model_id, _build_memory_keyboard)
+
+
+async def get_screen_size_keyboard(model_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('screen_size', model_id, _build_screen_size_keyboard)
+
+
+def get_cancel_keyboard():
+    keyboard = [
+        [KeyboardButton(text="Отмена")]
+    ]
+    reply_markup = ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+    return reply_markup
+
+
+async def get_ram_keyboard(model_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('ram', model_id, _build_ram_keyboard)
+
+
+async def get_connection_keyboard(model_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('connection', model_id, _build_connection_keyboard)
+
+
+async def get_add_to_basket_keyboard(item_id: int) -> InlineKeyboardMarkup:
+    return await _cached_markup('add_to_basket', item_id, _build_add_to_basket_keyboard)
+
+
 def get_individual_request_keyboard():
     inline_kb = InlineKeyboardMarkup(
         inline_keyboard=[
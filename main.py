@@ -1,24 +1,48 @@
 import os
 import asyncio
+from datetime import timedelta
 from aiogram import Dispatcher, Bot
+from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 from handlers.handlers import router as main_router
 from handlers.order import handlers_router as order_router
 from handlers.contact import router as manager_router
 from handlers.help_handlers import router as helper_router
 from database.models import async_main
+from database.catalog import CatalogWatcher, load_catalog
+from database.outbox import OutboxDispatcher
+from monitoring.loop_lag import loop_lag
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from handlers.admin import router as admin_router
+from database.storage import SqlStorage
+from state.selection import MemorySelectionStore, StorageSelectionStore
+from filters.config import selection_config, fsm_config, bot_config, catalog_config, db_config
+from middlewares.metrics import ApiMetricsMiddleware, HandlerNameMiddleware, UpdateMetricsMiddleware
+from middlewares.query_count import QueryCountMiddleware
+from web.metrics import start_metrics_server, watch_selection_store
+from web.webhook import run_webhook
 
 scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
 
 
-async def main():
-    load_dotenv()
-    await async_main()
-    bot = Bot(token=os.getenv('TOKEN_ID'))
+def build_dispatcher() -> Dispatcher:
+    if fsm_config.STORAGE == 'sql':
+        # Состояния и выбор в конфигураторе в БД — можно запускать несколько экземпляров бота
+        storage = SqlStorage(flush_interval=fsm_config.FLUSH_INTERVAL)
+        selection_store = StorageSelectionStore(storage)
+        scheduler.add_job(storage.purge, 'interval', hours=1,
+                          args=[StorageSelectionStore.DESTINY, timedelta(seconds=selection_config.TTL)])
+    else:
+        storage = MemoryStorage()
+        selection_store = MemorySelectionStore(max_entries=selection_config.MAX_ENTRIES, ttl=selection_config.TTL)
 
-    dp = Dispatcher()
+    dp = Dispatcher(storage=storage, selection_store=selection_store)
+    watch_selection_store(selection_store)
+    dp.update.outer_middleware(QueryCountMiddleware(db_config.QUERIES_PER_UPDATE_WARN))
+    # Время и ошибки по обработчикам; имя обработчика известно только после фильтров — во внутреннем middleware
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerNameMiddleware())
+    dp.callback_query.middleware(HandlerNameMiddleware())
 
     # Включаем все роутеры в основной диспетчере
     dp.include_router(main_router)
@@ -26,8 +50,44 @@ async def main():
     dp.include_router(helper_router)
     dp.include_router(manager_router)
     dp.include_router(admin_router)
+    return dp
+
+
+async def main():
+    load_dotenv()
+    await async_main()
+    await load_catalog()
+    bot = Bot(token=os.getenv('TOKEN_ID'))
+    bot.session.middleware(ApiMetricsMiddleware())
+
+    dp = build_dispatcher()
+    scheduler.start()
+    # Уведомления о заказах и другие сообщения из outbox доставляются в фоне
+    outbox = OutboxDispatcher(bot)
+    outbox.start()
+    loop_lag.start()
+    # Срез каталога в памяти догоняет изменения, сделанные другими экземплярами бота
+    catalog_watcher = CatalogWatcher(catalog_config.POLL_INTERVAL)
+    catalog_watcher.start()
+    metrics_runner = await start_metrics_server()
+
+    try:
+        if bot_config.MODE == 'webhook':
+            await run_webhook(dp, bot)
+        else:
+            # Telegram не отдаёт апдейты через getUpdates, пока установлен вебхук
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await catalog_watcher.stop()
+        await loop_lag.stop()
+        await outbox.stop()
+        # Записывает в БД состояния FSM, ещё ждущие в очереди SqlStorage; повторное закрытие безопасно
+        await dp['selection_store'].close()
+        await dp.storage.close()
 
-    await dp.start_polling(bot)
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,85 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from monitoring import metrics
+from monitoring.sql import current_queries
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: время обработки, ошибки и разбивка времени на БД и Bot API
+    по обработчикам. Регистрируется после QueryCountMiddleware, чтобы видеть счётчик запросов к БД."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        timings = metrics.UpdateTimings()
+        token = metrics.current_update.set(timings)
+        event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(timings.handler or 'unhandled')
+            raise
+        finally:
+            metrics.current_update.reset(token)
+            elapsed = time.perf_counter() - started
+            name = timings.handler or 'unhandled'
+            metrics.updates_total.inc(event_type)
+            metrics.update_duration.observe(elapsed, event_type)
+            metrics.handler_duration.observe(elapsed, name)
+            queries = current_queries.get()
+            if queries is not None:
+                metrics.handler_db_seconds.inc(name, amount=queries.duration)
+                metrics.handler_db_queries.inc(name, amount=queries.count)
+            metrics.handler_api_seconds.inc(name, amount=timings.api.duration)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: запоминает, какой обработчик выбран для апдейта.
+    Вызывается только после прохождения фильтров, поэтому имя точное."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        timings = metrics.current_update.get()
+        if timings is not None:
+            timings.handler = data['handler'].callback.__name__
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API, в том числе в рамках апдейта."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.api_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.api_duration.observe(elapsed, name)
+            timings = metrics.current_update.get()
+            if timings is not None:
+                timings.api.count += 1
+                timings.api.duration += elapsed
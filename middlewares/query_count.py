@@ -0,0 +1,37 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from monitoring.sql import QueryStats, current_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCountMiddleware(BaseMiddleware):
+    """Считает запросы к БД на каждый апдейт и предупреждает, если их больше warn_threshold —
+    так находятся обработчики, которые ходят в БД в цикле."""
+
+    def __init__(self, warn_threshold: int):
+        self.warn_threshold = warn_threshold
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = QueryStats()
+        token = current_queries.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current_queries.reset(token)
+            if stats.count > self.warn_threshold:
+                event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+                logger.warning('Апдейт %s (%s): %s запросов к БД, %.0f мс в БД из %.0f мс',
+                               getattr(event, 'update_id', None), event_type, stats.count,
+                               stats.duration * 1000, (time.perf_counter() - started) * 1000)
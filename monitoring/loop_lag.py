@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from filters.config import monitoring_config
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Измеряет задержку цикла событий: насколько позже запланированного просыпается sleep(interval).
+
+    Если обработчик блокирует цикл (синхронный ввод-вывод, тяжёлые вычисления), задержка растёт
+    одновременно для всех апдейтов — это и показывает метрика."""
+
+    def __init__(self, interval: float = 0.5, warn_threshold: float = 0.1, window: int = 120):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_threshold:
+                logger.warning('Цикл событий заблокирован на %.0f мс', lag * 1000)
+
+    def stats(self) -> Dict[str, float]:
+        """Задержка в секундах: последняя, средняя, 95-й перцентиль и максимум за окно, максимум за всё время."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {'last': 0.0, 'avg': 0.0, 'p95': 0.0, 'window_max': 0.0, 'max': self.max_lag}
+        return {
+            'last': self._samples[-1],
+            'avg': sum(samples) / len(samples),
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'window_max': samples[-1],
+            'max': self.max_lag,
+        }
+
+
+loop_lag = LoopLagMonitor(monitoring_config.LOOP_LAG_INTERVAL, monitoring_config.LOOP_LAG_WARN_THRESHOLD)
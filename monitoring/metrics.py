@@ -0,0 +1,139 @@
+import bisect
+import math
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from monitoring.sql import QueryStats
+
+# Метрики в текстовом формате Prometheus (GET /metrics, web/metrics.py). Скорость апдейтов
+# считается в Prometheus по счётчику: rate(bot_updates_total[1m]), p99 — histogram_quantile(0.99, ...)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: List['_Metric'] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # Метки -> [счётчики по корзинам (не накопительные), сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Значение читается функцией в момент запроса метрик — для уже собранной статистики
+    (задержка цикла событий, версия каталога)."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, read: Callable[[], float]):
+        super().__init__(name, description)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [f'{self.name} {_format_value(self.read())}']
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in _metrics) + '\n'
+
+
+class UpdateTimings:
+    """Куда ушло время апдейта: обработчик, запросы к Bot API. Запросы к БД считает monitoring.sql."""
+
+    __slots__ = ('handler', 'api')
+
+    def __init__(self):
+        self.handler: Optional[str] = None
+        self.api = QueryStats()
+
+
+# Задаётся middleware на время обработки апдейта (middlewares/metrics.py)
+current_update: ContextVar[Optional[UpdateTimings]] = ContextVar('current_update', default=None)
+
+
+updates_total = Counter('bot_updates_total', 'Обработанные апдейты', ['type'])
+update_duration = Histogram('bot_update_duration_seconds', 'Время обработки апдейта', ['type'])
+handler_duration = Histogram('bot_handler_duration_seconds', 'Время обработки апдейта по обработчикам',
+                             ['handler'])
+handler_errors = Counter('bot_handler_errors_total', 'Исключения в обработчиках', ['handler'])
+handler_db_seconds = Counter('bot_handler_db_seconds_total', 'Время запросов к БД в обработчиках', ['handler'])
+handler_db_queries = Counter('bot_handler_db_queries_total', 'Запросы к БД в обработчиках', ['handler'])
+handler_api_seconds = Counter('bot_handler_api_seconds_total', 'Время запросов к Bot API в обработчиках',
+                              ['handler'])
+api_duration = Histogram('bot_api_request_duration_seconds', 'Время запросов к Bot API', ['method'])
+api_errors = Counter('bot_api_request_errors_total', 'Ошибки запросов к Bot API', ['method'])
@@ -0,0 +1,73 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+# Отдельный логгер, чтобы медленные запросы можно было направить в свой файл
+slow_query_logger = logging.getLogger('slow_queries')
+
+# Сколько разных текстов запросов хранить в статистике: IN (...) с разным числом параметров даёт разные тексты
+_MAX_STATEMENTS = 500
+_SLOW_STATEMENT_LENGTH = 1000
+
+
+class QueryStats:
+    """Запросы к БД в рамках одного апдейта: количество и суммарное время в секундах."""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Задаётся middleware на время обработки апдейта (middlewares/query_count.py)
+current_queries: ContextVar[Optional[QueryStats]] = ContextVar('current_queries', default=None)
+
+# Текст запроса -> [число выполнений, суммарное время, максимальное время]
+_statements: Dict[str, List] = {}
+
+
+def top_statements(limit: int = 10) -> List[Tuple[str, int, float, float]]:
+    """Самые затратные запросы по суммарному времени: (текст, выполнений, всего секунд, максимум секунд)."""
+    rows = sorted(_statements.items(), key=lambda row: row[1][1], reverse=True)[:limit]
+    return [(statement, count, total, longest) for statement, (count, total, longest) in rows]
+
+
+def _record(statement: str, duration: float) -> None:
+    stats = _statements.get(statement)
+    if stats is None:
+        if len(_statements) >= _MAX_STATEMENTS:
+            return
+        stats = _statements[statement] = [0, 0.0, 0.0]
+    stats[0] += 1
+    stats[1] += duration
+    stats[2] = max(stats[2], duration)
+
+
+def instrument_engine(engine: Engine, slow_threshold: float) -> None:
+    """Замеряет время каждого запроса: статистика по текстам запросов, журнал медленных
+    запросов и счётчик запросов текущего апдейта. Параметры запросов не пишутся — в них
+    бывают телефоны и адреса клиентов."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._query_started
+        _record(statement, duration)
+
+        stats = current_queries.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+
+        if duration >= slow_threshold:
+            slow_query_logger.warning('Медленный запрос, %.0f мс: %s', duration * 1000,
+                                      ' '.join(statement.split())[:_SLOW_STATEMENT_LENGTH])
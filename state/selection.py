@@ -0,0 +1,161 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+
+class Selection:
+    """Выбор пользователя в конфигураторе товара."""
+
+    __slots__ = ('model_id', 'category_id', 'color_id', 'memory_id', 'screen_size_id')
+
+    def __init__(self, model_id: Optional[int] = None, category_id: Optional[int] = None,
+                 color_id: Optional[int] = None, memory_id: Optional[int] = None,
+                 screen_size_id: Optional[int] = None):
+        self.model_id = model_id
+        self.category_id = category_id
+        self.color_id = color_id
+        self.memory_id = memory_id
+        self.screen_size_id = screen_size_id
+
+    def as_dict(self) -> Dict[str, Optional[int]]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Optional[int]]) -> 'Selection':
+        return cls(**{field: data.get(field) for field in cls.__slots__})
+
+
+class BaseSelectionStore(ABC):
+    """Хранилище выбора пользователей в конфигураторе."""
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[Selection]:
+        pass
+
+    @abstractmethod
+    async def update(self, user_id: int, **values: Optional[int]) -> Selection:
+        """Обновляет указанные поля выбора пользователя, создавая запись при необходимости."""
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики для метрик (web/metrics.py)."""
+        return {}
+
+
+class _Entry:
+    __slots__ = ('selection', 'expires_at')
+
+    def __init__(self, selection: Selection, expires_at: float):
+        self.selection = selection
+        self.expires_at = expires_at
+
+
+class MemorySelectionStore(BaseSelectionStore):
+    """Выбор пользователей в памяти процесса.
+
+    Число записей ограничено max_entries (вытесняются давно не обращавшиеся пользователи),
+    записи без обращений дольше ttl секунд удаляются."""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, _Entry]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _purge_expired(self, now: float) -> None:
+        # Записи упорядочены по последнему обращению, поэтому просроченные всегда в начале
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            self.expirations += 1
+
+    async def get(self, user_id: int) -> Optional[Selection]:
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is None or entry.expires_at <= now:
+            if entry is not None:
+                del self._entries[user_id]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+        entry.expires_at = now + self.ttl
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry.selection
+
+    async def update(self, user_id: int, **values: Optional[int]) -> Selection:
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = _Entry(Selection(), now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            entry.expires_at = now + self.ttl
+            self._entries.move_to_end(user_id)
+
+        for field, value in values.items():
+            setattr(entry.selection, field, value)
+        return entry.selection
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class StorageSelectionStore(BaseSelectionStore):
+    """Выбор пользователей в FSM-хранилище aiogram под отдельным назначением (destiny).
+
+    Вместе с SqlStorage выбор становится общим для всех экземпляров бота и переживает перезапуск."""
+
+    DESTINY = 'selection'
+
+    def __init__(self, storage: BaseStorage, bot_id: int = 0):
+        self.storage = storage
+        self.bot_id = bot_id
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, user_id: int) -> StorageKey:
+        return StorageKey(bot_id=self.bot_id, chat_id=user_id, user_id=user_id, destiny=self.DESTINY)
+
+    async def get(self, user_id: int) -> Optional[Selection]:
+        data = await self.storage.get_data(self._key(user_id))
+        if not data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Selection.from_dict(data)
+
+    async def update(self, user_id: int, **values: Optional[int]) -> Selection:
+        key = self._key(user_id)
+        data = await self.storage.get_data(key)
+        data.update(values)
+        await self.storage.set_data(key, data)
+        return Selection.from_dict(data)
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,243 @@
+"""Микробенчмарки слоя работы с БД (database/requests.py) и клавиатур (keyboards/keyboards.py).
+
+Заполняет локальный файл SQLite синтетическим каталогом и для каждой функции замеряет
+операций в секунду и задержку p50/p99. Результат сохраняется в JSON; с --compare печатается
+сравнение с сохранённым ранее результатом, например из другой ветки.
+
+    python -m tools.benchmark --output bench.json
+    python -m tools.benchmark --output new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from tools.sandbox import seed_catalog, use_temp_sqlite
+
+DB_PATH = use_temp_sqlite('benchmark.db')
+
+# Размер синтетического каталога
+CATEGORIES = 5
+MODELS_PER_CATEGORY = 20
+COLORS_PER_MODEL = 6
+MEMORIES_PER_MODEL = 4
+USERS = 1000
+
+# Функции, которые не замеряются: им нужен Telegram, а не БД
+SKIPPED = {
+    'requests.send_message_to_all_users': 'рассылка через Bot API ограничена скоростью Telegram',
+}
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], Any]
+    # Подготовка перед каждым вызовом, в замер не входит
+    setup: Optional[Callable[[], Awaitable]] = None
+
+
+def _cases(ids: Dict[str, List[int]]) -> List[Case]:
+    from database import requests as rq
+    from database.catalog import get_catalog
+    from database.models import async_session
+    from keyboards import keyboards as kb
+
+    def pick(kind: str) -> Callable[[], int]:
+        values = ids[kind]
+        return lambda: random.choice(values)
+
+    model, color, memory, item, user, category = (pick(kind) for kind in
+                                                  ('models', 'colors', 'memories', 'items', 'users', 'categories'))
+    order = {'name': 'Иван', 'address': 'Москва', 'phone': '+79991234567', 'email': 'ivan@example.com',
+             'delivery_datetime': 'завтра', 'items': ''}
+    # Корзина пользователя для оформления заказа; пользователи идут по кругу, чтобы корзины не росли
+    buyers = itertools.cycle(ids['users'])
+    buyer = {}
+
+    async def fill_basket():
+        buyer['id'] = next(buyers)
+        await rq.add_item_to_basket(buyer['id'], item())
+
+    async def create_user():
+        async with async_session() as session:
+            await rq.create_user_if_not_exists(session, 100000 + user(), 'user')
+
+    async def notify():
+        async with async_session() as session:
+            rq.notify_admins(session, order)
+
+    def catalog_builder(build: Callable, key: Callable[[], Optional[int]]) -> Callable[[], Awaitable]:
+        async def run():
+            build(await get_catalog(), key())
+        return run
+
+    return [
+        Case('requests.get_categories', lambda: rq.get_categories()),
+        Case('requests.get_models_by_category', lambda: rq.get_models_by_category(category())),
+        Case('requests.get_models_colors', lambda: rq.get_models_colors(model())),
+        Case('requests.get_model', lambda: rq.get_model(model())),
+        Case('requests.get_all_models', lambda: rq.get_all_models()),
+        Case('requests.get_memory', lambda: rq.get_memory(memory())),
+        Case('requests.get_memories_by_model', lambda: rq.get_memories_by_model(model())),
+        Case('requests.get_model_by_color', lambda: rq.get_model_by_color(color())),
+        Case('requests.get_color', lambda: rq.get_color(color())),
+        Case('requests.get_screen_sizes_by_model', lambda: rq.get_screen_sizes_by_model(model())),
+        Case('requests.get_model_by_memory', lambda: rq.get_model_by_memory(memory())),
+        Case('requests.get_color_by_model', lambda: rq.get_color_by_model(model())),
+        Case('requests.get_ram', lambda: rq.get_ram(1)),
+        Case('requests.get_rams_by_model', lambda: rq.get_rams_by_model(model())),
+        Case('requests.get_screen_size', lambda: rq.get_screen_size(1)),
+        Case('requests.get_connectivities_by_model', lambda: rq.get_connectivities_by_model(model())),
+        Case('requests.get_connectivity', lambda: rq.get_connectivity(1)),
+        Case('requests.resolve_variant', lambda: rq.resolve_variant(color(), memory_id=memory())),
+        Case('requests.add_item_to_basket', lambda: rq.add_item_to_basket(user(), item())),
+        Case('requests.get_basket_items', lambda: rq.get_basket_items(user())),
+        Case('requests.remove_item_from_basket', lambda: rq.remove_item_from_basket(user(), item())),
+        Case('requests.checkout', lambda: rq.checkout(buyer['id'], order), setup=fill_basket),
+        Case('requests.clear_basket', lambda: rq.clear_basket(user())),
+        Case('requests.create_user_if_not_exists', create_user),
+        Case('requests.register_user', lambda: rq.register_user(user())),
+        Case('requests.get_all_users', lambda: rq.get_all_users()),
+        Case('requests.notify_admins', notify),
+
+        Case('keyboards.get_main_keyboard', lambda: kb.get_main_keyboard()),
+        Case('keyboards.get_basket_keyboard', lambda: kb.get_basket_keyboard()),
+        Case('keyboards.get_cancel_keyboard', lambda: kb.get_cancel_keyboard()),
+        Case('keyboards.get_individual_request_keyboard', lambda: kb.get_individual_request_keyboard()),
+        Case('keyboards.get_catalog', lambda: kb.get_catalog()),
+        Case('keyboards.get_models_keyboard', lambda: kb.get_models_keyboard(category())),
+        Case('keyboards.get_colors_keyboard', lambda: kb.get_colors_keyboard(model())),
+        Case('keyboards.get_memory_keyboard', lambda: kb.get_memory_keyboard(model())),
+        Case('keyboards.get_screen_size_keyboard', lambda: kb.get_screen_size_keyboard(model())),
+        Case('keyboards.get_ram_keyboard', lambda: kb.get_ram_keyboard(model())),
+        Case('keyboards.get_connection_keyboard', lambda: kb.get_connection_keyboard(model())),
+        Case('keyboards.get_add_to_basket_keyboard', lambda: kb.get_add_to_basket_keyboard(item())),
+        # Построение клавиатур без кэша — столько стоит первый показ после смены версии каталога
+        Case('keyboards.build_catalog', catalog_builder(kb._build_catalog, lambda: None)),
+        Case('keyboards.build_models_keyboard', catalog_builder(kb._build_models_keyboard, category)),
+        Case('keyboards.build_colors_keyboard', catalog_builder(kb._build_colors_keyboard, model)),
+        Case('keyboards.build_memory_keyboard', catalog_builder(kb._build_memory_keyboard, model)),
+        Case('keyboards.build_screen_size_keyboard', catalog_builder(kb._build_screen_size_keyboard, model)),
+        Case('keyboards.build_ram_keyboard', catalog_builder(kb._build_ram_keyboard, model)),
+        Case('keyboards.build_connection_keyboard', catalog_builder(kb._build_connection_keyboard, model)),
+        Case('keyboards.build_add_to_basket_keyboard', catalog_builder(kb._build_add_to_basket_keyboard, item)),
+    ]
+
+
+async def _call(run: Callable[[], Any]) -> None:
+    result = run()
+    if inspect.isawaitable(result):
+        await result
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def _measure(case: Case, iterations: int, warmup: int) -> Dict[str, float]:
+    samples = []
+    for number in range(warmup + iterations):
+        if case.setup is not None:
+            await case.setup()
+        started = time.perf_counter()
+        await _call(case.run)
+        elapsed = time.perf_counter() - started
+        if number >= warmup:
+            samples.append(elapsed)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations / total if total else 0.0,
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': _percentile(samples, 0.50) * 1000,
+        'p99_ms': _percentile(samples, 0.99) * 1000,
+    }
+
+
+async def _prime_keyboards(ids: Dict[str, List[int]]) -> None:
+    # Клавиатуры get_* замеряются в установившемся режиме, когда кэш уже заполнен
+    from keyboards import keyboards as kb
+
+    await kb.get_catalog()
+    for category_id in ids['categories']:
+        await kb.get_models_keyboard(category_id)
+    for model_id in ids['models']:
+        for build in (kb.get_colors_keyboard, kb.get_memory_keyboard, kb.get_screen_size_keyboard,
+                      kb.get_ram_keyboard, kb.get_connection_keyboard):
+            await build(model_id)
+    for item_id in ids['items']:
+        await kb.get_add_to_basket_keyboard(item_id)
+
+
+async def _run(iterations: int, warmup: int, only: Optional[str]) -> Dict[str, Any]:
+    from database.catalog import load_catalog
+
+    random.seed(1)
+    ids = await seed_catalog(CATEGORIES, MODELS_PER_CATEGORY, COLORS_PER_MODEL, MEMORIES_PER_MODEL, USERS)
+    await load_catalog()
+    await _prime_keyboards(ids)
+
+    results = {}
+    for case in _cases(ids):
+        if only and only not in case.name:
+            continue
+        results[case.name] = await _measure(case, iterations, warmup)
+        row = results[case.name]
+        print(f'{case.name:50} {row["ops_per_sec"]:>10.0f} оп/с  p50 {row["p50_ms"]:8.3f} мс  '
+              f'p99 {row["p99_ms"]:8.3f} мс')
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'catalog': {'categories': CATEGORIES, 'models': len(ids['models']), 'colors': len(ids['colors']),
+                        'items': len(ids['items']), 'users': len(ids['users'])},
+        },
+        'results': results,
+        'skipped': SKIPPED,
+    }
+
+
+def _compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f'\n{"":50} {"p50 было":>10} {"p50 стало":>10} {"изменение":>10}')
+    for name, row in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            print(f'{name:50} {"—":>10} {row["p50_ms"]:>10.3f}')
+            continue
+        change = (row['p50_ms'] / before['p50_ms'] - 1) * 100 if before['p50_ms'] else 0.0
+        print(f'{name:50} {before["p50_ms"]:>10.3f} {row["p50_ms"]:>10.3f} {change:>+9.1f}%')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Микробенчмарки database/requests.py и keyboards/keyboards.py')
+    parser.add_argument('--output', default='benchmark.json', help='куда сохранить результат (JSON)')
+    parser.add_argument('--compare', help='JSON прошлого запуска для сравнения')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', help='замерять только функции, в имени которых есть эта строка')
+    args = parser.parse_args()
+
+    report = asyncio.run(_run(args.iterations, args.warmup, args.only))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результат сохранён в {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            _compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
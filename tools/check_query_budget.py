@@ -0,0 +1,148 @@
+"""Бюджет запросов к БД для пользовательских сценариев.
+
+Прогоняет сценарии (просмотр категории, выбор модели и варианта, корзина, оформление заказа,
+команды администратора, импорт прайса) через диспетчер бота на временной базе SQLite. Запросы
+к Bot API не уходят в сеть — их принимает заглушка сессии. Пользовательские сценарии проходят
+дважды: с хранилищем состояний в памяти и с FSM_STORAGE=sql (сценарии fsm_sql_*). Для каждого
+сценария считаются SQL-запросы и выдачи соединений из пула, результат сравнивается
+с tools/query_budget.json. Если сценарий превысил бюджет, скрипт завершается с кодом 1.
+
+    python -m tools.check_query_budget            # проверка
+    python -m tools.check_query_budget --update   # записать текущие значения как бюджет
+"""
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from tools.sandbox import seed_catalog, use_temp_sqlite
+
+use_temp_sqlite('query_budget.db')
+
+from aiogram import Bot  # noqa: E402
+from aiogram.dispatcher.event.bases import UNHANDLED  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from tools import telegram_stub as stub  # noqa: E402
+
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), 'query_budget.json')
+USER_ID = 7
+ADMIN_ID = 1454714038
+
+
+def message(text: str, user_id: int = USER_ID) -> Update:
+    return stub.message(text, user_id)
+
+
+def callback(data: str, user_id: int = USER_ID) -> Update:
+    return stub.callback(data, user_id)
+
+
+# Сценарии выполняются по порядку одним пользователем, как в живом диалоге
+FLOWS: List[Tuple[str, List[Update]]] = [
+    ('start', [message('/start')]),
+    ('browse_category', [message('Каталог'), callback('category_1')]),
+    ('pick_model', [callback('model_1')]),
+    ('pick_variant', [callback('color_1'), callback('memory_1')]),
+    ('add_to_basket', [callback('add_to_basket_1')]),
+    ('add_to_basket_again', [callback('add_to_basket_1')]),
+    ('show_basket', [message('Корзина')]),
+    ('checkout', [message('Оформить заказ'), message('Иван'), message('Москва'), message('+79991234567'),
+                  message('ivan@example.com'), message('завтра')]),
+    ('admin_reload_catalog', [message('/reload_catalog', ADMIN_ID)]),
+    ('admin_catalog_status', [message('/catalog_status', ADMIN_ID)]),
+    ('admin_export_prices', [message('/export_prices', ADMIN_ID)]),
+    ('admin_top_queries', [message('/top_queries', ADMIN_ID)]),
+    # Цена вне диапазона seed_catalog — строка всегда меняет цену
+    ('admin_import_prices', [stub.document('prices.csv', 'ID;Цена\n1;999999\n'.encode('utf-8-sig'), ADMIN_ID)]),
+]
+# С FSM_STORAGE=sql состояние и выбор в конфигураторе читаются и пишутся в БД на каждом шаге
+SQL_STORAGE_PREFIX = 'fsm_sql_'
+FLOWS += [(SQL_STORAGE_PREFIX + name, updates) for name, updates in FLOWS if not name.startswith('admin_')]
+
+
+async def _measure() -> Dict[str, Dict[str, int]]:
+    from database.catalog import load_catalog
+    from database.models import engine
+    from database.storage import SqlStorage
+    from main import build_dispatcher
+    from state.selection import StorageSelectionStore
+
+    counters = {'statements': 0, 'checkouts': 0}
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def count_statement(*args):
+        counters['statements'] += 1
+
+    @event.listens_for(engine.sync_engine.pool, 'checkout')
+    def count_checkout(*args):
+        counters['checkouts'] += 1
+
+    await seed_catalog(categories=1, models_per_category=1, colors_per_model=1, memories_per_model=1, users=0)
+    await load_catalog()
+    dispatcher = build_dispatcher()
+    memory_storage, memory_selection = dispatcher.storage, dispatcher['selection_store']
+    # Роутеры подключаются только к одному диспетчеру, поэтому для FSM_STORAGE=sql подменяем хранилища
+    # так же, как это делает build_dispatcher. Очередь записей сбрасывается после каждого апдейта, а не
+    # по таймеру — так число запросов не зависит от скорости прогона
+    sql_storage = SqlStorage(flush_interval=3600)
+    sql_selection = StorageSelectionStore(sql_storage)
+    bot = Bot('42:BUDGET', session=stub.StubSession())
+
+    results = {}
+    for name, updates in FLOWS:
+        sql = name.startswith(SQL_STORAGE_PREFIX)
+        dispatcher.fsm.storage = sql_storage if sql else memory_storage
+        dispatcher['selection_store'] = sql_selection if sql else memory_selection
+        counters.update(statements=0, checkouts=0)
+        for update in updates:
+            # Бюджет имеет смысл, только если апдейт дошёл до обработчика
+            if await dispatcher.feed_update(bot, update) is UNHANDLED:
+                raise RuntimeError(f'{name}: апдейт {update.event_type} не обработан ни одним обработчиком')
+            if sql:
+                await sql_storage.flush()
+        results[name] = dict(counters)
+    await sql_storage.close()
+    await memory_storage.close()
+    return results
+
+
+def main() -> int:
+    results = asyncio.run(_measure())
+
+    if '--update' in sys.argv:
+        with open(BUDGET_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f'Бюджет записан в {BUDGET_PATH}')
+        return 0
+
+    with open(BUDGET_PATH, encoding='utf-8') as f:
+        budget = json.load(f)
+
+    failures = 0
+    for name, actual in results.items():
+        limits = budget.get(name)
+        if limits is None:
+            failures += 1
+            print(f'{name}: нет бюджета, добавьте его (--update)')
+            continue
+        over = [f'{key} {value} > {limits.get(key, 0)}' for key, value in actual.items()
+                if value > limits.get(key, 0)]
+        under = [f'{key} {value} < {limits[key]}' for key, value in actual.items()
+                 if value < limits.get(key, 0)]
+        if over:
+            failures += 1
+            print(f'{name}: ПРЕВЫШЕН БЮДЖЕТ: ' + ', '.join(over))
+        elif under:
+            print(f'{name}: в пределах бюджета, его можно уменьшить: ' + ', '.join(under))
+        else:
+            print(f'{name}: {actual["statements"]} запросов, {actual["checkouts"]} соединений')
+    print(f'Сценариев: {len(results)}, превысили бюджет: {failures}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Проверка планов запросов к БД.
+
+Прогоняет функции работы с БД на временной базе SQLite и для каждого выполненного запроса
+снимает EXPLAIN QUERY PLAN. Если запрос с условием WHERE читает таблицу целиком
+(SCAN без индекса), скрипт печатает план и завершается с кодом 1.
+
+    python -m tools.check_query_plans
+"""
+import asyncio
+import os
+import re
+import sys
+
+from tools.sandbox import seed_catalog, use_temp_sqlite
+
+DB_PATH = use_temp_sqlite('query_plans.db')
+
+from sqlalchemy import event  # noqa: E402
+
+# Полный просмотр таблицы: «SCAN items» (в старых версиях SQLite — «SCAN TABLE items»)
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*USING)')
+_WHERE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+# Массовые операции с временной таблицей импорта цен обходят её целиком по определению
+_BULK_TABLES = ('price_import_staging',)
+
+
+async def _run_queries() -> None:
+    """Вызывает функции работы с БД в том виде, в каком их вызывают обработчики."""
+    from datetime import datetime, timedelta
+
+    from database import requests as rq
+    from database.broadcast import (_acquire, _next_batch, _release, _renew, _save_progress, create_broadcast,
+                                    resume_broadcasts)
+    from database.catalog import load_catalog, refresh_items
+    from database.models import async_session
+    from database.outbox import _claim
+    from database.prices import export_prices, import_prices, last_export_time
+    from database.storage import SqlStorage
+    from aiogram.fsm.storage.base import StorageKey
+
+    await load_catalog()
+    await refresh_items([1])
+
+    await rq.get_model_by_memory(1)
+    await rq.add_item_to_basket(2, 1)
+    await rq.add_item_to_basket(2, 1)
+    await rq.get_basket_items(2)
+    await rq.remove_item_from_basket(2, 1)
+    await rq.add_item_to_basket(2, 1)
+    await rq.checkout(2, {'name': 'n', 'address': 'a', 'phone': 'p', 'email': 'e', 'delivery_datetime': 'd',
+                          'items': ''})
+    await rq.clear_basket(2)
+    async with async_session() as session:
+        await rq.create_user_if_not_exists(session, 1001, 'user')
+    await rq.get_all_users()
+
+    price_list = os.path.join(os.path.dirname(DB_PATH), 'prices.csv')
+    with open(price_list, 'w', encoding='utf-8-sig') as f:
+        f.write('ID;Цена\n1;100000\n2;1\n')
+    await import_prices(price_list)
+    document, _ = await export_prices(since=await last_export_time() or datetime(2000, 1, 1))
+    document.close()
+
+    await resume_broadcasts(None)
+    broadcast_id = await create_broadcast('text')
+    await _acquire(broadcast_id, 'owner')
+    await _renew(broadcast_id, 'owner')
+    await _next_batch(broadcast_id, 0, 100)
+    await _save_progress(broadcast_id, 'owner', [{'broadcast_id': broadcast_id, 'user_id': 1, 'status': 'sent',
+                                                  'attempts': 1, 'error': None}], 1)
+    await _release(broadcast_id, 'owner')
+    await _claim(10)
+
+    storage = SqlStorage()
+    key = StorageKey(bot_id=0, chat_id=1, user_id=1)
+    await storage.set_data(key, {'a': 1})
+    await storage.flush()
+    await storage.get_data(key)
+    await storage.set_data(key, {})
+    await storage.flush()
+    await storage.purge('default', timedelta(hours=1))
+
+
+def _check(plans) -> int:
+    failures = 0
+    for statement, plan in plans:
+        scans = [detail for detail in plan if _FULL_SCAN.match(detail) and not detail.startswith('SCAN CONSTANT')]
+        # Запросы без WHERE (загрузка справочников в память, выгрузка прайса) читают таблицу целиком намеренно
+        if scans and _WHERE.search(statement) and not any(table in statement for table in _BULK_TABLES):
+            failures += 1
+            print('FULL SCAN:', ' '.join(statement.split()))
+            for detail in plan:
+                print('    ', detail)
+    return failures
+
+
+def main() -> int:
+    from database.models import engine
+
+    engine.echo = False
+    plans = {}
+
+    # План снимается в том же соединении прямо перед запросом — так видны и временные таблицы
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement in plans or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+            return
+        # executemany передаёт список наборов параметров — для плана достаточно первого
+        if executemany and parameters and isinstance(parameters[0], (tuple, list)):
+            parameters = parameters[0]
+        explain_cursor = conn.connection.cursor()
+        explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        plans[statement] = [row[3] for row in explain_cursor.fetchall()]
+        explain_cursor.close()
+
+    async def run():
+        await seed_catalog(categories=1, models_per_category=1, colors_per_model=1, memories_per_model=1, users=1)
+        plans.clear()
+        await _run_queries()
+        await engine.dispose()
+
+    asyncio.run(run())
+    failures = _check(plans.items())
+    print(f'Проверено запросов: {len(plans)}, с полным просмотром таблицы: {failures}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
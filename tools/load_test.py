@@ -0,0 +1,280 @@
+"""Нагрузочный прогон бота целиком: сколько покупателей одновременно выдерживает один процесс.
+
+Собирает настоящий диспетчер (main.build_dispatcher) и подаёт в feed_update синтетические апдейты
+от покупателей. Каждый покупатель проходит воронку: /start, Каталог, категория, модель, цвет, память,
+добавление в корзину, Корзина, Оформить заказ и форма заказа. Апдейты одного покупателя идут
+последовательно, как в живом диалоге; покупатели работают параллельно. Число покупателей растёт
+ступенями, на каждой ступени печатаются апдейты в секунду, задержки p50/p95/p99, задержка цикла
+событий, занятость пула соединений и доля времени в БД. В конце — ступень, после которой пропускная
+способность перестаёт расти, и что в неё упирается: пул соединений БД или цикл событий.
+
+Bot API заменён заглушкой (tools/telegram_stub.py), --api-latency добавляет задержку Telegram.
+По умолчанию база — временный файл SQLite с синтетическим каталогом; --db-url позволяет прогнать
+нагрузку на MySQL, база должна быть пустой — таблицы и каталог создаются скриптом.
+
+    python -m tools.load_test
+    python -m tools.load_test --levels 1,10,50,100 --duration 20 --api-latency 0.05 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+from sqlalchemy import event
+
+from tools import telegram_stub as stub
+from tools.sandbox import seed_catalog, use_temp_sqlite
+
+# Размер синтетического каталога; покупатели выбирают товары в категории iPhone
+CATEGORIES = 5
+MODELS_PER_CATEGORY = 20
+COLORS_PER_MODEL = 6
+MEMORIES_PER_MODEL = 4
+# telegram_id покупателей: у каждой ступени свой диапазон, чтобы состояние не переходило между ступенями
+SHOPPER_ID_BASE = 10_000_000
+SHOPPER_ID_STEP = 1_000_000
+# Ступень считается точкой насыщения, если пропускная способность выросла меньше чем на 10%
+SATURATION_GAIN = 0.10
+
+
+def _session(user_id: int, variant: Tuple[int, int, int, int, int]) -> List[Tuple[str, Update]]:
+    category_id, model_id, color_id, memory_id, item_id = variant
+    return [
+        ('start', stub.message('/start', user_id)),
+        ('catalog', stub.message('Каталог', user_id)),
+        ('category', stub.callback(f'category_{category_id}', user_id)),
+        ('model', stub.callback(f'model_{model_id}', user_id)),
+        ('color', stub.callback(f'color_{color_id}', user_id)),
+        ('memory', stub.callback(f'memory_{memory_id}', user_id)),
+        ('add_to_basket', stub.callback(f'add_to_basket_{item_id}', user_id)),
+        ('basket', stub.message('Корзина', user_id)),
+        ('checkout', stub.message('Оформить заказ', user_id)),
+        ('order_name', stub.message('Иван', user_id)),
+        ('order_address', stub.message('Москва', user_id)),
+        ('order_phone', stub.message('+79991234567', user_id)),
+        ('order_email', stub.message('ivan@example.com', user_id)),
+        ('order_delivery', stub.message('завтра', user_id)),
+    ]
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class PoolWatch:
+    """Соединения пула: сколько выдано сейчас и максимум за ступень, плюс время запросов к БД."""
+
+    def __init__(self, engine):
+        self.pool = engine.sync_engine.pool
+        # У QueuePool есть предел соединений; NullPool и StaticPool не ограничивают параллельность
+        self.capacity = self.pool.size() + self.pool._max_overflow if hasattr(self.pool, 'size') else None
+        self.in_use = 0
+        self.max_in_use = 0
+        self.db_seconds = 0.0
+
+        event.listen(self.pool, 'checkout', self._checkout)
+        event.listen(self.pool, 'checkin', self._checkin)
+        event.listen(engine.sync_engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine.sync_engine, 'after_cursor_execute', self._after_execute)
+
+    def reset(self) -> None:
+        self.max_in_use = self.in_use
+        self.db_seconds = 0.0
+
+    def _checkout(self, *args) -> None:
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def _checkin(self, *args) -> None:
+        self.in_use -= 1
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        context._load_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.db_seconds += time.perf_counter() - context._load_started
+
+
+async def _shopper(dispatcher, bot: Bot, user_id: int, variants: List[Tuple], deadline: float,
+                   think_time: float, result: Dict[str, Any]) -> None:
+    while time.perf_counter() < deadline:
+        for step, update in _session(user_id, random.choice(variants)):
+            if time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                handled = await dispatcher.feed_update(bot, update)
+            except Exception as e:
+                error = f'{step}: {type(e).__name__}'
+                result['errors'][error] = result['errors'].get(error, 0) + 1
+                # Недошедшая до конца сессия оставит покупателя в форме заказа — начинаем заново
+                await dispatcher.storage.set_state(StorageKey(bot.id, user_id, user_id), None)
+                break
+            elapsed = time.perf_counter() - started
+            if handled is UNHANDLED:
+                result['unhandled'][step] = result['unhandled'].get(step, 0) + 1
+            result['latencies'].append(elapsed)
+            result['steps'].setdefault(step, []).append(elapsed)
+            if think_time:
+                await asyncio.sleep(random.uniform(0, 2 * think_time))
+
+
+async def _run_level(dispatcher, bot: Bot, pool: PoolWatch, shoppers: int, level: int,
+                     variants: List[Tuple], duration: float, think_time: float) -> Dict[str, Any]:
+    from monitoring.loop_lag import LoopLagMonitor
+
+    result = {'latencies': [], 'steps': {}, 'errors': {}, 'unhandled': {}}
+    lag = LoopLagMonitor(interval=0.01, warn_threshold=float('inf'), window=100_000)
+    pool.reset()
+    api_requests = bot.session.requests
+    lag.start()
+    started = time.perf_counter()
+    deadline = started + duration
+    first_id = SHOPPER_ID_BASE + level * SHOPPER_ID_STEP
+    await asyncio.gather(*(_shopper(dispatcher, bot, first_id + number, variants, deadline, think_time, result)
+                           for number in range(shoppers)))
+    elapsed = time.perf_counter() - started
+    await lag.stop()
+
+    latencies = sorted(result['latencies'])
+    lag_stats = lag.stats()
+    busy = sum(latencies)
+    return {
+        'shoppers': shoppers,
+        'updates': len(latencies),
+        'updates_per_sec': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'loop_lag_p95_ms': lag_stats['p95'] * 1000,
+        'loop_lag_max_ms': lag_stats['window_max'] * 1000,
+        'pool_max_in_use': pool.max_in_use,
+        'pool_capacity': pool.capacity,
+        # Доля времени обработки апдейтов, проведённая в запросах к БД
+        'db_share': pool.db_seconds / busy if busy else 0.0,
+        'api_requests': bot.session.requests - api_requests,
+        'steps_p95_ms': {step: _percentile(sorted(samples), 0.95) * 1000
+                         for step, samples in result['steps'].items()},
+        'errors': result['errors'],
+        'unhandled': result['unhandled'],
+    }
+
+
+def _saturation(levels: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Первая ступень, на которой рост числа покупателей почти не прибавил пропускной способности."""
+    for previous, current in zip(levels, levels[1:]):
+        if current['updates_per_sec'] >= previous['updates_per_sec'] * (1 + SATURATION_GAIN):
+            continue
+        if current['pool_capacity'] is not None and current['pool_max_in_use'] >= current['pool_capacity']:
+            reason = (f'пул соединений БД: заняты все {current["pool_capacity"]} соединений, '
+                      f'апдейты ждут свободное соединение')
+        elif current['loop_lag_p95_ms'] >= current['p50_ms'] * 0.5:
+            reason = (f'цикл событий: задержка цикла p95 {current["loop_lag_p95_ms"]:.1f} мс '
+                      f'при p50 апдейта {current["p50_ms"]:.1f} мс — процессор занят обработкой')
+        elif current['db_share'] >= 0.5:
+            reason = (f'БД: {current["db_share"]:.0%} времени апдейтов уходит на запросы, '
+                      f'база не успевает при росте параллельности')
+        else:
+            reason = 'не определено: ни пул, ни цикл событий, ни БД не выглядят узким местом'
+        return {'shoppers': previous['shoppers'], 'updates_per_sec': previous['updates_per_sec'],
+                'reason': reason}
+    return None
+
+
+async def _run(args) -> Dict[str, Any]:
+    from database.catalog import load_catalog
+    from database.models import engine
+    from filters.config import IPHONE_CATEGORY_ID
+    from main import build_dispatcher
+
+    random.seed(1)
+    ids = await seed_catalog(CATEGORIES, MODELS_PER_CATEGORY, COLORS_PER_MODEL, MEMORIES_PER_MODEL, users=0)
+    await load_catalog()
+    # Сценарий выбора цвет → память есть у категории iPhone
+    variants = [variant for variant in ids['variants'] if variant[0] == IPHONE_CATEGORY_ID]
+
+    dispatcher = build_dispatcher()
+    bot = Bot('42:LOAD', session=stub.StubSession(latency=args.api_latency))
+    pool = PoolWatch(engine)
+
+    print(f'{"покупателей":>11} {"апд/с":>8} {"p50 мс":>8} {"p95 мс":>8} {"p99 мс":>8} '
+          f'{"лаг p95":>8} {"пул":>7} {"БД":>5} {"ошибок":>7}')
+    levels = []
+    for level, shoppers in enumerate(args.levels):
+        row = await _run_level(dispatcher, bot, pool, shoppers, level, variants, args.duration, args.think_time)
+        levels.append(row)
+        capacity = '—' if row['pool_capacity'] is None else f'{row["pool_max_in_use"]}/{row["pool_capacity"]}'
+        print(f'{shoppers:>11} {row["updates_per_sec"]:>8.0f} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+              f'{row["p99_ms"]:>8.1f} {row["loop_lag_p95_ms"]:>8.1f} {capacity:>7} {row["db_share"]:>5.0%} '
+              f'{sum(row["errors"].values()):>7}')
+        for error, count in row['errors'].items():
+            print(f'{"":>11} ошибка {error}: {count}')
+        if row['unhandled']:
+            print(f'{"":>11} не обработаны: {row["unhandled"]}')
+
+    await dispatcher.storage.close()
+    await engine.dispose()
+    return {
+        'meta': {'duration': args.duration, 'api_latency': args.api_latency, 'think_time': args.think_time,
+                 'database': engine.dialect.name, 'variants': len(variants)},
+        'levels': levels,
+        'saturation': _saturation(levels),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон диспетчера бота синтетическими покупателями')
+    parser.add_argument('--levels', default='1,2,5,10,20,50,100',
+                        type=lambda value: [int(level) for level in value.split(',')],
+                        help='число одновременных покупателей на ступенях, через запятую')
+    parser.add_argument('--duration', type=float, default=10.0, help='длительность ступени, секунд')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа Bot API, секунд')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='средняя пауза покупателя между действиями, секунд')
+    parser.add_argument('--db-url', help='база для прогона вместо временного SQLite (должна быть пустой)')
+    parser.add_argument('--output', help='сохранить результат в JSON')
+    args = parser.parse_args()
+
+    # Медленные запросы и апдейты с множеством запросов под нагрузкой видны в сводке, журнал их не дублирует
+    logging.getLogger('slow_queries').setLevel(logging.ERROR)
+    logging.getLogger('middlewares.query_count').setLevel(logging.ERROR)
+    if args.db_url:
+        os.environ['SQLALCHEMY_URL'] = args.db_url
+    else:
+        use_temp_sqlite('load_test.db')
+
+    report = asyncio.run(_run(args))
+    saturation = report['saturation']
+    if saturation is None:
+        print('Насыщение не достигнуто: пропускная способность растёт на всех ступенях')
+    else:
+        print(f'Насыщение после {saturation["shoppers"]} покупателей '
+              f'({saturation["updates_per_sec"]:.0f} апд/с): {saturation["reason"]}')
+
+    last = report['levels'][-1]
+    slowest = sorted(last['steps_p95_ms'].items(), key=lambda row: row[1], reverse=True)[:3]
+    print(f'Самые медленные шаги при {last["shoppers"]} покупателях (p95): '
+          + ', '.join(f'{step} {value:.0f} мс' for step, value in slowest))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'Результат сохранён в {args.output}')
+
+    # Апдейт без обработчика значит, что сценарий разошёлся с кодом бота и замер неверен
+    return 1 if any(row['unhandled'] for row in report['levels']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Временная база SQLite для скриптов в tools/. Импортируется до database.models:
+адрес БД задаётся через SQLALCHEMY_URL при импорте."""
+import itertools
+import os
+import random
+import tempfile
+from typing import Dict, List
+
+from sqlalchemy import BigInteger, insert
+from sqlalchemy.ext.compiler import compiles
+
+
+def use_temp_sqlite(filename: str) -> str:
+    path = os.path.join(tempfile.mkdtemp(), filename)
+    os.environ['SQLALCHEMY_URL'] = f'sqlite+aiosqlite:///{path}'
+    return path
+
+
+# В SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+@compiles(BigInteger, 'sqlite')
+def _big_integer(type_, compiler, **kw):
+    return 'INTEGER'
+
+
+async def seed_catalog(categories: int = 5, models_per_category: int = 20, colors_per_model: int = 6,
+                       memories_per_model: int = 4, users: int = 1000) -> Dict[str, List]:
+    """Создаёт таблицы и заполняет синтетический каталог: у каждой модели все сочетания цвета и памяти.
+
+    Возвращает id созданных записей по видам, а в variants — кортежи
+    (category_id, model_id, color_id, memory_id, item_id) для сценариев выбора товара."""
+    from database import models as m
+
+    async with m.engine.begin() as connection:
+        await connection.run_sync(m.Base.metadata.create_all)
+
+    category_rows, models, colors, memories, items, variants = [], [], [], [], [], []
+    for category_id in range(1, categories + 1):
+        category_rows.append({'id': category_id, 'name': f'Категория {category_id}'})
+        for _ in range(models_per_category):
+            model_id = len(models) + 1
+            models.append({'id': model_id, 'name': f'Модель {model_id}', 'category_id': category_id})
+            model_colors = [len(colors) + index + 1 for index in range(colors_per_model)]
+            model_memories = [len(memories) + index + 1 for index in range(memories_per_model)]
+            colors.extend({'id': color_id, 'name': f'Цвет {color_id}', 'model_id': model_id}
+                          for color_id in model_colors)
+            memories.extend({'id': memory_id, 'size': f'{128 * 2 ** index}GB', 'model_id': model_id}
+                            for index, memory_id in enumerate(model_memories))
+            for color_id, memory_id in itertools.product(model_colors, model_memories):
+                item_id = len(items) + 1
+                items.append({'id': item_id, 'name': f'Товар {item_id}', 'description': '',
+                              'price': random.randint(10000, 300000), 'category_id': category_id,
+                              'model_id': model_id, 'color_id': color_id, 'memory_id': memory_id})
+                variants.append((category_id, model_id, color_id, memory_id, item_id))
+    user_rows = [{'id': user_id, 'username': f'user_{user_id}', 'telegram_id': 100000 + user_id}
+                 for user_id in range(1, users + 1)]
+
+    async with m.async_session() as session:
+        for model, rows in ((m.Category, category_rows), (m.Model, models), (m.Color, colors),
+                            (m.Memory, memories), (m.Item, items), (m.Users, user_rows)):
+            if rows:
+                await session.execute(insert(model), rows)
+        await session.execute(insert(m.Connectivity), [{'id': 1, 'type': 'Wi-Fi'}, {'id': 2, 'type': 'Cellular'}])
+        await session.commit()
+
+    return {'categories': [row['id'] for row in category_rows], 'models': [row['id'] for row in models],
+            'colors': [row['id'] for row in colors], 'memories': [row['id'] for row in memories],
+            'items': [row['id'] for row in items], 'users': [row['id'] for row in user_rows],
+            'variants': variants}
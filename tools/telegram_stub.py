@@ -0,0 +1,75 @@
+"""Заглушка Bot API и синтетические апдейты для скриптов в tools/: диспетчер работает как в бою,
+но запросы к Telegram не уходят в сеть."""
+import asyncio
+import itertools
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import CallbackQuery, Chat, Document, File, Message, PhotoSize, Update, User
+
+_ids = itertools.count(1)
+# file_id -> содержимое файлов, присланных апдейтами document(); по нему отвечают get_file и скачивание
+_files = {}
+
+
+class StubSession(BaseSession):
+    """Сессия бота без сети: на отправку сообщений отвечает сообщением, на остальное — True.
+    latency — задержка каждого запроса в секундах, как у настоящего Bot API."""
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.requests = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url: str, *args, **kwargs):
+        # Адрес файла заканчивается его file_path, а file_path заглушки совпадает с file_id
+        yield _files.get(url.rsplit('/', 1)[-1], b'')
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.__returning__ is File:
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=method.file_id)
+        if method.__returning__ is Message:
+            return Message(message_id=next(_ids), date=datetime.now(),
+                           chat=Chat(id=getattr(method, 'chat_id', None) or 0, type='private'),
+                           photo=self._photo(getattr(method, 'photo', None)))
+        return True
+
+    @staticmethod
+    def _photo(photo):
+        # На отправку фото Telegram возвращает file_id: тот же, если фото отправлено по file_id, иначе новый
+        if photo is None:
+            return None
+        file_id = photo if isinstance(photo, str) else f'stub-file-{next(_ids)}'
+        return [PhotoSize(file_id=file_id, file_unique_id=file_id, width=1280, height=960)]
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name='user', username=f'user{user_id}')
+
+
+def message(text: str, user_id: int) -> Update:
+    return Update(update_id=next(_ids), message=Message(
+        message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type='private'),
+        from_user=_user(user_id), text=text))
+
+
+def document(file_name: str, content: bytes, user_id: int) -> Update:
+    file_id = f'stub-document-{next(_ids)}'
+    _files[file_id] = content
+    return Update(update_id=next(_ids), message=Message(
+        message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type='private'),
+        from_user=_user(user_id),
+        document=Document(file_id=file_id, file_unique_id=file_id, file_name=file_name, file_size=len(content))))
+
+
+def callback(data: str, user_id: int) -> Update:
+    return Update(update_id=next(_ids), callback_query=CallbackQuery(
+        id=str(next(_ids)), from_user=_user(user_id), chat_instance='stub', data=data,
+        message=Message(message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type='private'),
+                        text='card')))
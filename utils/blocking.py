@@ -0,0 +1,18 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from filters.config import prices_config
+
+T = TypeVar('T')
+
+# Отдельный небольшой пул для файлов и CSV: тяжёлый импорт прайса не занимает ни цикл событий,
+# ни стандартный пул asyncio, и одновременно работает не больше FILE_WORKERS потоков
+_file_executor = ThreadPoolExecutor(max_workers=prices_config.FILE_WORKERS, thread_name_prefix='files')
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполняет блокирующую функцию (файловый ввод-вывод, разбор CSV) в пуле потоков."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_file_executor, functools.partial(func, *args, **kwargs))
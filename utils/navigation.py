@@ -0,0 +1,52 @@
+import logging
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+
+from database.models import Item
+from database.photos import send_item_photo
+from filters.config import navigation_config
+
+logger = logging.getLogger(__name__)
+
+
+async def show_step(callback: CallbackQuery, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """Показывает следующий шаг каталога вместо сообщения, на кнопку которого нажали.
+
+    В режиме редактирования (NAVIGATION_EDIT_IN_PLACE) это один запрос editMessageText вместо
+    sendMessage и deleteMessage. Если сообщение нельзя отредактировать (старше 48 часов,
+    без текста), шаг отправляется новым сообщением, как при выключенном режиме."""
+    message = callback.message
+    if navigation_config.EDIT_IN_PLACE and isinstance(message, Message) and message.text is not None:
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+            return
+        except TelegramBadRequest as e:
+            # Повторное нажатие той же кнопки: сообщение уже показывает этот шаг
+            if 'message is not modified' in e.message:
+                return
+            logger.debug('Не удалось отредактировать сообщение %s: %s', message.message_id, e.message)
+
+    await message.answer(text, reply_markup=reply_markup)
+    await _delete(message)
+
+
+async def show_card(callback: CallbackQuery, item: Item, text: str,
+                    reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """Карточка товара: фото с подписью и кнопками, если у товара есть картинка, иначе текст как show_step.
+    Текстовое сообщение нельзя превратить в фото редактированием, поэтому фото приходит новым сообщением."""
+    message = callback.message
+    if await send_item_photo(callback.bot, message.chat.id, item, text, reply_markup) is None:
+        await show_step(callback, text, reply_markup)
+        return
+    await _delete(message)
+
+
+async def _delete(message) -> None:
+    if not isinstance(message, Message):
+        return
+    try:
+        await message.delete()
+    except TelegramBadRequest as e:
+        logger.debug('Не удалось удалить сообщение %s: %s', message.message_id, e.message)
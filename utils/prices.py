@@ -0,0 +1,24 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Union
+
+# Цены хранятся в Numeric(12, 2): рубли с копейками, без ошибок округления float
+_CENTS = Decimal('0.01')
+_MAX_PRICE = Decimal('9999999999.99')
+
+
+def parse_price(raw: Union[str, int, Decimal]) -> Decimal:
+    """Разбирает цену из прайса: допускает пробелы-разделители разрядов, запятую и «руб.»."""
+    value = str(raw).replace('\xa0', '').replace(' ', '').replace('руб.', '').replace('руб', '').replace(',', '.')
+    try:
+        price = Decimal(value).quantize(_CENTS, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'Некорректная цена: {raw!r}')
+    if price < 0 or price > _MAX_PRICE:
+        raise ValueError(f'Некорректная цена: {raw!r}')
+    return price
+
+
+def format_price(price: Decimal) -> str:
+    """Цена для сообщений: 99990 или 99990.50, без лишних нулей копеек."""
+    price = Decimal(price).quantize(_CENTS)
+    return str(price.quantize(Decimal(1))) if price == price.to_integral_value() else str(price)
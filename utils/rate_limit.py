@@ -0,0 +1,40 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Ограничитель скорости: не больше rate операций в секунду, всплеск до capacity.
+
+    pause() останавливает всех ожидающих — так общий для бота flood wait (429 RetryAfter)
+    соблюдается всеми задачами сразу, а не только той, что его получила."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # После паузы начинаем с пустого ведра, без всплеска накопленных токенов
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    async def acquire(self) -> None:
+        # Под блокировкой ожидающие получают токены строго по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,63 @@
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from database.catalog import catalog_stats
+from filters.config import monitoring_config
+from monitoring import metrics
+from monitoring.loop_lag import loop_lag
+from state.selection import BaseSelectionStore
+
+logger = logging.getLogger(__name__)
+
+metrics.Gauge('event_loop_lag_seconds', 'Последняя задержка цикла событий', lambda: loop_lag.stats()['last'])
+metrics.Gauge('event_loop_lag_p95_seconds', '95-й перцентиль задержки цикла событий за окно',
+              lambda: loop_lag.stats()['p95'])
+metrics.Gauge('catalog_source_version', 'Версия каталога в БД, которую содержит срез в памяти',
+              lambda: catalog_stats()['source_version'])
+metrics.Gauge('catalog_reload_duration_seconds', 'Длительность последней полной загрузки каталога',
+              lambda: catalog_stats()['last_reload_duration'])
+metrics.Gauge('catalog_staleness_seconds', 'Отставание среза каталога от БД при последнем обновлении',
+              lambda: catalog_stats()['last_staleness'])
+
+# Хранилище выбора в конфигураторе создаёт build_dispatcher (main.py) и передаёт сюда через watch_selection_store
+_selection_store: Optional[BaseSelectionStore] = None
+
+
+def watch_selection_store(store: BaseSelectionStore) -> None:
+    global _selection_store
+    _selection_store = store
+
+
+def _selection_stat(name: str) -> float:
+    if _selection_store is None:
+        return 0
+    return _selection_store.stats().get(name, 0)
+
+
+metrics.Gauge('selection_store_entries', 'Пользователей в хранилище выбора в памяти',
+              lambda: _selection_stat('entries'))
+metrics.Gauge('selection_store_hits', 'Чтения выбора, нашедшие запись', lambda: _selection_stat('hits'))
+metrics.Gauge('selection_store_misses', 'Чтения выбора без записи', lambda: _selection_stat('misses'))
+metrics.Gauge('selection_store_evictions', 'Записи выбора, вытесненные по max_entries',
+              lambda: _selection_stat('evictions'))
+metrics.Gauge('selection_store_expirations', 'Записи выбора, удалённые по TTL', lambda: _selection_stat('expirations'))
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.render().encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    """Запускает отдельный локальный HTTP-сервер с /metrics; None, если METRICS_PORT = 0."""
+    if not monitoring_config.METRICS_PORT:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=monitoring_config.METRICS_HOST, port=monitoring_config.METRICS_PORT).start()
+    logger.info('Метрики: http://%s:%s/metrics', monitoring_config.METRICS_HOST, monitoring_config.METRICS_PORT)
+    return runner
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from sqlalchemy import text
+
+from database.catalog import catalog_version
+from database.models import engine
+from filters.config import webhook_config
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+# Процесс жив — отвечает балансировщику, даже если БД недоступна
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok'})
+
+
+# Процесс готов принимать апдейты: каталог загружен и БД отвечает
+async def ready(request: web.Request) -> web.Response:
+    if not catalog_version():
+        return web.json_response({'status': 'catalog not loaded'}, status=503)
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+    except Exception as e:
+        logger.warning('Проверка готовности: БД недоступна: %s', e)
+        return web.json_response({'status': 'database unavailable'}, status=503)
+    return web.json_response({'status': 'ready', 'catalog_version': catalog_version()})
+
+
+def _check_webhook_config() -> None:
+    # Без секрета любой, кто узнал адрес вебхука, может присылать поддельные апдейты от имени
+    # покупателей и администраторов; без адреса Telegram некуда слать апдейты
+    missing = [name for name, value in (('WEBHOOK_BASE_URL', webhook_config.BASE_URL),
+                                        ('WEBHOOK_SECRET', webhook_config.SECRET)) if not value]
+    if missing:
+        raise ValueError(f"BOT_MODE=webhook requires {' and '.join(missing)} to be set in environment variables")
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    _check_webhook_config()
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(webhook_config.MAX_CONCURRENCY))
+
+    async def on_startup(bot: Bot) -> None:
+        await bot.set_webhook(
+            url=webhook_config.BASE_URL + webhook_config.PATH,
+            secret_token=webhook_config.SECRET,
+            max_connections=webhook_config.MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info('Вебхук установлен: %s%s', webhook_config.BASE_URL, webhook_config.PATH)
+
+    dp.startup.register(on_startup)
+
+    app = web.Application()
+    app.router.add_get('/healthz', health)
+    app.router.add_get('/readyz', ready)
+    # Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются с 401
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=webhook_config.SECRET).register(
+        app, path=webhook_config.PATH
+    )
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    runner = web.AppRunner(build_webhook_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host=webhook_config.HOST, port=webhook_config.PORT)
+    await site.start()
+    logger.info('Сервер вебхука слушает %s:%s', webhook_config.HOST, webhook_config.PORT)
+    # Как start_polling, по SIGTERM и SIGINT останавливаемся штатно, чтобы отработали finally в main
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()